@@ -19,10 +19,15 @@ app.config.from_object('config')
 if os.path.isfile(os.path.join(app.root_path, 'instance/config.py')):
     app.config.from_pyfile('config.py')
 
+if os.environ.get('RECITE_CONFIG'):
+    app.config.from_envvar('RECITE_CONFIG')
+
 app.config['SQLALCHEMY_DATABASE_URI'] = parse_db_uri(conf=app.config['DB_SETTINGS'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
 from . import models
+from . import assets
+from . import profiling
 from . import views
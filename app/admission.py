@@ -0,0 +1,143 @@
+# -*- coding: ascii -*-
+"""
+app.admission
+~~~~~~~~~~~~~
+
+Admission control of heavy requests, shared by all web processes through
+locked slot files: a bounded number of checks run at once, a bounded
+number wait for them, and each client runs a bounded number of checks.
+"""
+
+import os
+import time
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from .utils import private_folder, open_private
+
+__all__ = ['Admission', 'Ticket', 'Rejected']
+
+# Seconds between attempts to lock a slot held by another request
+POLL_INTERVAL = 0.05
+
+# Number of buckets clients are hashed into, bounding the number of slot files
+CLIENT_BUCKETS = 1024
+
+
+class Rejected(Exception):
+    """A request was not admitted, with HTTP status and seconds to wait before retrying"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Slots held by an admitted request, released when it ends"""
+
+    def __init__(self, files):
+        self._files = files
+
+    def release(self):
+        """Release slots, can be called several times"""
+        while self._files:
+            self._files.pop().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Admission:
+    """
+    Slots of heavy requests, a slot being a file locked with flock by the
+    request holding it. Locks are released by the system if a process
+    dies, so slots are never leaked. Without fcntl, every request is
+    admitted.
+    """
+
+    def __init__(self, path, slots, queue=0, wait=10, per_client=None, retry_after=10):
+        """
+        :param path:        folder of slot files, only accessible by the current user
+                            so that other users cannot hold slots, created if missing
+        :type path:         str
+        :param slots:       maximum number of requests running at once
+        :type slots:        int
+        :param queue:       maximum number of requests waiting for a slot
+        :type queue:        int
+        :param wait:        maximum seconds a request waits for a slot
+        :type wait:         int or float
+        :param per_client:  maximum number of requests of a client at once, None for no limit
+        :type per_client:   int or None
+        :param retry_after: seconds rejected clients are told to wait
+        :type retry_after:  int
+        """
+        self.path = path
+        self.slots = slots
+        self.queue = queue
+        self.wait = wait
+        self.per_client = per_client
+        self.retry_after = retry_after
+        private_folder(path)
+
+    def _acquire(self, name, count, timeout=0):
+        """Lock one of count slot files of name, returns its file object, or None if all are locked"""
+
+        end = time.monotonic() + timeout
+        while True:
+            for i in range(count):
+                fp = open_private(os.path.join(self.path, '%s-%d.lock' % (name, i)), 'a')
+                try:
+                    fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fp
+                except BlockingIOError:
+                    fp.close()
+            if time.monotonic() >= end:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def admit(self, client):
+        """
+        Admit a request, waiting in queue if all slots are taken
+
+        :param client:  client identifier, e.g. its IP address
+        :type client:   str
+        :return:        slots held by request, to be released when it ends
+        :rtype:         Ticket
+        :raises:        Rejected with status 429 if client has too many requests running,
+                        503 if queue is full or no slot was freed in time
+        """
+
+        ticket = Ticket([])
+        if fcntl is None:
+            return ticket
+
+        try:
+            if self.per_client is not None:
+                bucket = int(hashlib.sha1(client.encode('utf-8')).hexdigest(), 16) % CLIENT_BUCKETS
+                fp = self._acquire('client-%d' % bucket, self.per_client)
+                if fp is None:
+                    raise Rejected(429, 'Too many concurrent checks of client', self.retry_after)
+                ticket._files.append(fp)
+
+            fp = self._acquire('slot', self.slots)
+            if fp is None:
+                queued = self._acquire('queue', self.queue) if self.queue else None
+                if queued is None:
+                    raise Rejected(503, 'Check queue is full', self.retry_after)
+                with queued:
+                    fp = self._acquire('slot', self.slots, timeout=self.wait)
+                if fp is None:
+                    raise Rejected(503, 'No check slot freed in time', self.retry_after)
+            ticket._files.append(fp)
+        except BaseException:
+            ticket.release()
+            raise
+        return ticket
@@ -0,0 +1,53 @@
+# -*- coding: ascii -*-
+"""
+app.assets
+~~~~~~~~~~
+
+Fingerprinted static assets built by build_static.py.
+"""
+
+import os
+import json
+from flask import url_for
+from . import app
+
+__all__ = ['ASSETS_DIR', 'MANIFEST_FILE', 'asset_url']
+
+#: Directory of fingerprinted assets
+ASSETS_DIR = os.path.join(app.static_folder, 'dist')
+
+#: Manifest file mapping static file names to their fingerprinted names
+MANIFEST_FILE = os.path.join(ASSETS_DIR, 'manifest.json')
+
+# Manifest loaded on first use
+_manifest = None
+
+
+def load_manifest():
+    """Returns manifest of fingerprinted assets, empty if assets were not built"""
+
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_FILE) as fp:
+                _manifest = json.load(fp)
+        except (IOError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+@app.template_global()
+def asset_url(filename):
+    """
+    URL of a static file, fingerprinted if assets were built
+
+    :param filename:    path of file in static folder
+    :type filename:     str
+    :return:            URL of fingerprinted asset, or of static file if not built
+    :rtype:             str
+    """
+
+    fingerprinted = load_manifest().get(filename)
+    if fingerprinted:
+        return url_for('assets', filename=fingerprinted)
+    return url_for('static', filename=filename)
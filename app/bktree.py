@@ -0,0 +1,173 @@
+# -*- coding: ascii -*-
+"""
+app.bktree
+~~~~~~~~~~
+
+BK-tree metric index of citations, pruning edit distance comparisons
+by the triangle inequality.
+"""
+
+import os
+import json
+import hashlib
+from Levenshtein import distance
+
+__all__ = ['BKTree', 'digest']
+
+# Version of serialized trees, increased when their format changes
+FORMAT_VERSION = 2
+
+
+def digest(entries):
+    """Hash of IDs and normalized values of citations, in their order"""
+
+    ret = hashlib.sha1()
+    for entry in entries:
+        ret.update(('%d\x1f%s\x1e' % (entry.id, entry.normalized)).encode('utf-8'))
+    return ret.hexdigest()
+
+
+class BKTree:
+    """
+    BK-tree over normalized values of citations. Each node keeps its
+    children by their edit distance to it, so that a query within radius r
+    of a value at distance d of a node only visits children at distances
+    d - r to d + r.
+    """
+
+    def __init__(self, entries=()):
+        """
+        :param entries: citations with id and normalized attributes
+        :type entries:  list
+        """
+
+        # Node i holds entry _items[i], children of node i are _children[i] (distance -> node)
+        self._items = []
+        self._values = []
+        self._children = []
+
+        #: Number of queries and of nodes visited by them, for measuring pruning
+        self.queries = 0
+        self.visits = 0
+
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, entry):
+        """Add citation into the tree"""
+
+        value = entry.normalized
+        node = len(self._items)
+        self._items.append(entry)
+        self._values.append(value)
+        self._children.append({})
+        if not node:
+            return
+
+        parent = 0
+        while True:
+            d = distance(value, self._values[parent])
+            child = self._children[parent].get(d)
+            if child is None:
+                self._children[parent][d] = node
+                return
+            parent = child
+
+    def search(self, value, radius):
+        """
+        Find citations within radius of normalized value
+
+        :param value:   normalized citation
+        :type value:    str
+        :param radius:  maximum edit distance
+        :type radius:   int
+        :return:        list of (edit distance, citation) found, and number of nodes visited
+        :rtype:         tuple
+        """
+
+        if not self._items:
+            return [], 0
+
+        ret = []
+        visits = 0
+        stack = [0]
+        values = self._values
+        children = self._children
+        while stack:
+            node = stack.pop()
+            visits += 1
+            d = distance(value, values[node])
+            if d <= radius:
+                ret.append((d, self._items[node]))
+            for k, child in children[node].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+
+        self.queries += 1
+        self.visits += visits
+        return ret, visits
+
+    def query(self, value, radius):
+        """Returns citations within radius of normalized value"""
+        return [entry for _, entry in self.search(value, radius)[0]]
+
+    def dump(self, path):
+        """
+        Serialize tree into a JSON file, citations are stored by their IDs,
+        with a hash of their values checked when loading
+
+        :param path:    file path, written atomically
+        :type path:     str
+        """
+
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'w') as fp:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'digest': digest(self._items),
+                'ids': [e.id for e in self._items],
+                'children': [sorted(children.items()) for children in self._children]
+            }, fp, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, entries):
+        """
+        Load tree serialized by dump()
+
+        :param path:    file path
+        :type path:     str
+        :param entries: citations the tree was built from
+        :type entries:  list
+        :return:        loaded tree, or None if file is missing or invalid, or
+                        does not match IDs and values of citations
+        :rtype:         BKTree or None
+        """
+
+        try:
+            with open(path) as fp:
+                data = json.load(fp)
+            by_id = {e.id: e for e in entries}
+            if data['version'] != FORMAT_VERSION or len(data['ids']) != len(by_id):
+                return None
+            items = [by_id[i] for i in data['ids']]
+            count = len(items)
+            children = [{int(d): int(node) for d, node in pairs} for pairs in data['children']]
+        except (IOError, ValueError, TypeError, KeyError):
+            return None
+
+        # Nodes are appended after their parent, so children have higher indexes (no cycle)
+        if len(children) != count or any(not parent < node < count
+                                         for parent, c in enumerate(children) for node in c.values()):
+            return None
+        if data['digest'] != digest(items):
+            return None
+
+        ret = cls()
+        ret._items = items
+        ret._values = [e.normalized for e in items]
+        ret._children = children
+        return ret
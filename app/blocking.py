@@ -0,0 +1,124 @@
+# -*- coding: ascii -*-
+"""
+app.blocking
+~~~~~~~~~~~~
+
+Blocking index of citations keyed on publication year and first author surname.
+"""
+
+import re
+from collections import defaultdict
+from Levenshtein import distance
+from styles.parsers import parse_author, parse_year
+from .utils import normalize
+
+__all__ = ['article_key', 'citation_key', 'BlockingIndex']
+
+#: Maximum edit distance between surnames of neighbouring blocks
+SURNAME_TYPOS = 1
+
+#: Maximum difference between years of neighbouring blocks
+YEAR_TYPOS = 1
+
+# Find first word (surname, group author or title) of a citation
+find_first_word = re.compile(r'^\W*([^\W\d_][\w-]*)').findall
+
+# Find years in a citation
+find_years = re.compile(r'(?<!\d)((?:1[89]|20)\d{2})(?!\d)').findall
+
+# Conference citation types, dated by conference date
+CONFERENCE_TYPES = ('apa_conference', 'ama_conference')
+
+
+def first_word(text):
+    """Returns normalized first word of text or empty"""
+    found = find_first_word(normalize(text or ''))
+    return found[0] if found else ''
+
+
+def article_key(article, type_):
+    """
+    Generates block key of a citation from its article fields,
+    using the same parsers as the citation styles.
+
+    :param article:     article fields (author, group_author, article_title, pub_year, pub_date, conf_date)
+    :type article:      object
+    :param type_:       citation type
+    :type type_:        str
+    :return:            tuple of (year, surname), or None if no year found
+    :rtype:             tuple or None
+    """
+
+    if type_ in CONFERENCE_TYPES:
+        year = parse_year(article.conf_date)
+    else:
+        year = parse_year(article.pub_year) or parse_year(article.pub_date)
+
+    if not year:
+        return None
+
+    authors = parse_author(article.author or '')
+    surname = first_word(authors[0] if authors else article.group_author or article.article_title)
+    return int(year), surname
+
+
+def citation_key(citation):
+    """
+    Extracts block key from a parsed citation.
+
+    :param citation:    parsed citation
+    :type citation:     str
+    :return:            tuple of (years, surname), or None if not found
+    :rtype:             tuple or None
+    """
+
+    years = set(int(y) for y in find_years(citation))
+    surname = first_word(citation)
+    if years and surname:
+        return years, surname
+    return None
+
+
+class BlockingIndex:
+    """In-memory index of citations grouped by (year, surname)"""
+
+    def __init__(self):
+        self._blocks = defaultdict(list)
+        self._surnames = defaultdict(set)
+        self._unblocked = []
+
+    def add(self, item, key):
+        """Add item into the block of key, or into every block if key is None"""
+        if key is None:
+            self._unblocked.append(item)
+        else:
+            year, surname = key
+            self._blocks[key].append(item)
+            self._surnames[year].add(surname)
+
+    def _neighbours(self, years, surname):
+        """Generates keys of blocks matching years and surname with typos"""
+        for year in years:
+            for y in range(year - YEAR_TYPOS, year + YEAR_TYPOS + 1):
+                for s in self._surnames.get(y, ()):
+                    if s == surname or distance(s, surname) <= SURNAME_TYPOS:
+                        yield y, s
+
+    def query(self, citation):
+        """
+        Find citations in the blocks of input citation
+
+        :param citation:    parsed citation
+        :type citation:     str
+        :return:            list of candidate items, or None if citation cannot be blocked
+        :rtype:             list or None
+        """
+
+        key = citation_key(citation)
+        if key is None:
+            return None
+
+        ret = list(self._unblocked)
+        for block in set(self._neighbours(*key)):
+            ret.extend(self._blocks.get(block, ()))
+        return ret
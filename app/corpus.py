@@ -0,0 +1,359 @@
+# -*- coding: ascii -*-
+"""
+app.corpus
+~~~~~~~~~~
+
+In-memory corpus of citations used for matching, loaded once per generation.
+"""
+
+import os
+import gc
+import glob
+from collections import namedtuple
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from . import app, db
+from .models import Article, Citation, Metadata, GENERATION
+from .lsh import LSHIndex, minhash, unpack_signature, relative_distance
+from .blocking import BlockingIndex, article_key
+from .bktree import BKTree
+from .histogram import HistogramFilter, np
+from .utils import normalize, normalize_all, closest_match, citation_style, private_folder
+
+__all__ = ['Corpus', 'get_corpus', 'loaded_corpus', 'preload_corpus']
+
+#: A citation of the corpus, detached from database session
+Entry = namedtuple('Entry', 'id value normalized type article_id')
+
+# Corpus loaded in current process
+_corpus = None
+
+
+class Corpus:
+    """Citations available for matching, with their candidate index"""
+
+    def __init__(self, entries, generation, index='scan', lookup=None, variants=()):
+        self.entries = entries
+        self.generation = generation
+        self.index = index
+        self._lookup = lookup
+
+        # Character histogram filters by style, see build_histograms()
+        self._histograms = None
+
+        # Partitions of citations by type, and citations of types compatible with each style.
+        # Citations of one style are never within edit distance of citations of another one.
+        self.partitions = {}
+        for entry in entries:
+            self.partitions.setdefault(entry.type, []).append(entry)
+        self._types = {}
+        for type_ in sorted(self.partitions):
+            self._types.setdefault(citation_style(type_), set()).add(type_)
+        self._styles = {
+            style: [entry for type_ in sorted(types) for entry in self.partitions[type_]]
+            for style, types in self._types.items()
+        }
+
+        # Map of normalized citations and their variants to their (article ID, type) pairs.
+        # Variants are only matched exactly, they are not candidates for edit distance.
+        self.exact = {}
+        for entry in entries + list(variants):
+            self.exact.setdefault(entry.normalized, []).append((entry.article_id, entry.type))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def compatible(self, citations, style):
+        """Filter citations of types compatible with style"""
+        types = self._types.get(style, ())
+        return [entry for entry in citations if entry.type in types]
+
+    def candidates(self, citation, max_distance):
+        """
+        Select citations to be verified against input citation. If style
+        of input citation is known (see ParsedCitation), only citations of
+        compatible types are selected.
+
+        :param citation:        input citation
+        :type citation:         str or ParsedCitation
+        :param max_distance:    maximum edit distance
+        :type max_distance:     int
+        :return:                candidate citations and maximum edit distance for them
+        :rtype:                 tuple
+        """
+
+        style = getattr(citation, 'style', None)
+
+        if self.index == 'bktree':
+            normalized = normalize(citation)
+            if style:
+                trees = [self._lookup[style]] if style in self._lookup else []
+            else:
+                trees = self._lookup.values()
+            found = [entry for tree in trees for entry in tree.query(normalized, max_distance)]
+            return sorted(found, key=lambda entry: entry.id), max_distance
+
+        if self.index == 'lsh':
+            found = self._lookup.query(minhash(citation))
+            return (
+                self.compatible(found, style) if style else found,
+                relative_distance(citation, app.config['MAX_RELATIVE_EDIT_DISTANCE'], max_distance)
+            )
+
+        if self.index == 'blocking':
+            block = self._lookup.query(citation)
+            if block is not None:
+                return self.compatible(block, style) if style else block, max_distance
+
+        if self._histograms is not None:
+            normalized = normalize(citation)
+            if style:
+                histograms = [self._histograms[style]] if style in self._histograms else []
+            else:
+                histograms = self._histograms.values()
+            found = [entry for h in histograms for entry in h.candidates(normalized, max_distance)]
+            return found if style else sorted(found, key=lambda entry: entry.id), max_distance
+
+        if style:
+            return self._styles.get(style, []), max_distance
+        return self.entries, max_distance
+
+    def closest(self, citation, max_distance, deadline=None):
+        """
+        Find the closest citation of the corpus, using the exact-match map first
+
+        :param citation:        input citation
+        :type citation:         str
+        :param max_distance:    maximum edit distance
+        :type max_distance:     int
+        :param deadline:        time.monotonic() value after which MatchTimeout is raised, default is None
+        :type deadline:         float or None
+        :return:                (edit distance, article ID) if match found, else None
+        :rtype:                 tuple or None
+        """
+
+        found = self.exact.get(normalize(citation))
+        if found:
+            return 0, found[0][0]
+        if max_distance <= 0:
+            return None
+
+        found = closest_match(citation, *self.candidates(citation, max_distance), deadline=deadline)
+        if found:
+            return found[0], found[1].article_id
+        return None
+
+
+def corpus_generation():
+    """
+    Returns generation of citations currently stored in database, a hash of
+    their content stored by freshdb.py. Databases filled before it was stored
+    fall back to a cheap fingerprint, which misses updates keeping IDs.
+    """
+
+    try:
+        generation = db.session.query(Metadata.value).filter_by(key=GENERATION).scalar()
+    except SQLAlchemyError:
+        db.session.rollback()
+        generation = None
+    if generation:
+        return generation
+    count, last = db.session.query(func.count(Citation.id), func.max(Citation.id)).one()
+    return '%d-%d' % (count, last or 0)
+
+
+def build_lsh(entries, signatures):
+    """Build LSH index of entries from their signatures stored in database"""
+
+    lookup = LSHIndex(bands=app.config['LSH_BANDS'])
+    for entry, signature in zip(entries, signatures):
+        # Signatures are computed at ingest, missing ones are computed here
+        lookup.add(entry, unpack_signature(signature) if signature else minhash(entry.value))
+    return lookup
+
+
+def build_blocking(entries):
+    """Build blocking index of entries from fields of their articles"""
+
+    articles = {
+        row.id: row for row in db.session.query(
+            Article.id, Article.author, Article.group_author, Article.article_title,
+            Article.pub_year, Article.pub_date, Article.conf_date
+        )
+    }
+    lookup = BlockingIndex()
+    for entry in entries:
+        article = articles.get(entry.article_id)
+        lookup.add(entry, article_key(article, entry.type) if article else None)
+    return lookup
+
+
+def bktree_path(generation, shard, style):
+    """Returns path of serialized BK-tree of a style, for a generation of the corpus (or of its shard)"""
+    prefix = 'shard%dof%d' % tuple(shard) if shard is not None else 'all'
+    return os.path.join(app.config['BKTREE_PATH'], 'bktree-%s-%s-%s.json' % (prefix, style, generation))
+
+
+def build_bktrees(corpus, shard=None):
+    """
+    Load BK-trees of citations of each style, serialized by a previous
+    load of the same generation, else build and serialize them. Trees are
+    built without being serialized if BKTREE_PATH is not a private folder
+    of the application (see private_folder()).
+
+    :param corpus:  corpus without index
+    :type corpus:   Corpus
+    :param shard:   (index, count) of the corpus shard, or None
+    :type shard:    tuple or None
+    :return:        BK-tree by style
+    :rtype:         dict
+    """
+
+    try:
+        private_folder(app.config['BKTREE_PATH'])
+    except OSError as e:
+        app.logger.error('BK-trees are not serialized: %s', e)
+        return {style: BKTree(entries) for style, entries in corpus._styles.items()}
+
+    ret = {}
+    for style, entries in corpus._styles.items():
+        target = bktree_path(corpus.generation, shard, style)
+        ret[style] = BKTree.load(target, entries)
+        if ret[style] is None:
+            ret[style] = BKTree(entries)
+            try:
+                ret[style].dump(target)
+            except OSError:
+                pass
+
+    # Remove trees of previous generations
+    current = {bktree_path(corpus.generation, shard, style) for style in ret}
+    for name in glob.glob(bktree_path('*', shard, '*')):
+        if name not in current:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+    return ret
+
+
+def build_histograms(corpus):
+    """Build character histogram filters of citations of each style"""
+    return {style: HistogramFilter(entries) for style, entries in corpus._styles.items()}
+
+
+def load_corpus(generation, shard=None):
+    """
+    Load all citations from database into a corpus
+
+    :param generation:  fingerprint of citations being loaded
+    :type generation:   str
+    :param shard:       (index, count) to load only citations of articles with
+                        ID modulo count equal to index, default is all citations
+    :type shard:        tuple or None
+    :return:            loaded corpus
+    :rtype:             Corpus
+    """
+
+    index = app.config['MATCH_INDEX']
+    query = db.session.query(
+        Citation.id, Citation.value, Citation.type, Citation.article_id, Citation.signature, Citation.variant
+    )
+    if shard is not None:
+        query = query.filter(Citation.article_id % shard[1] == shard[0])
+    rows = query.order_by(Citation.id).all()
+    variants = [row for row in rows if row.variant]
+    rows = [row for row in rows if not row.variant]
+
+    normalized = normalize_all(row.value for row in rows)
+    entries = [Entry(row.id, row.value, n, row.type, row.article_id) for row, n in zip(rows, normalized)]
+    normalized = normalize_all(row.value for row in variants)
+    variants = [Entry(row.id, row.value, n, row.type, row.article_id) for row, n in zip(variants, normalized)]
+
+    if index == 'lsh':
+        lookup = build_lsh(entries, [row.signature for row in rows])
+    elif index == 'blocking':
+        lookup = build_blocking(entries)
+    elif index in ('scan', 'bktree', 'trigram'):
+        lookup = None
+    else:
+        raise ValueError('Unknown match index: %s' % index)
+
+    corpus = Corpus(entries=entries, generation=generation, index=index, lookup=lookup, variants=variants)
+    if index == 'bktree':
+        corpus._lookup = build_bktrees(corpus, shard=shard)
+    if app.config['HISTOGRAM_FILTER'] and np is not None and index in ('scan', 'blocking', 'trigram'):
+        corpus._histograms = build_histograms(corpus)
+    return corpus
+
+
+def get_corpus(shard=None):
+    """Returns the corpus (or its shard) of current process, reloaded when database changed"""
+
+    global _corpus
+    try:
+        generation = corpus_generation()
+        if _corpus is None or _corpus.generation != generation:
+            _corpus = load_corpus(generation, shard=shard)
+    except SQLAlchemyError:
+        db.session.rollback()
+        missing = missing_schema()
+        if missing:
+            app.logger.error('Database was created by an older freshdb.py, missing %s: run freshdb.py to re-create it',
+                             ', '.join(missing))
+        raise
+    return _corpus
+
+
+def missing_schema():
+    """
+    Returns tables and columns of models missing in database, created before
+    they were added. freshdb.py re-creates tables whose schema changed.
+
+    :return:    names of missing tables and columns (as table.column)
+    :rtype:     list
+    """
+
+    try:
+        inspector = inspect(db.engine)
+        tables = set(inspector.get_table_names())
+        missing = []
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                missing.append(table.name)
+                continue
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            missing.extend('%s.%s' % (table.name, name) for name in table.columns.keys() if name not in columns)
+    except SQLAlchemyError:
+        return []
+    return missing
+
+
+def loaded_corpus():
+    """Returns the corpus of current process if already loaded, else None, without querying the database"""
+    return _corpus
+
+
+def preload_corpus():
+    """
+    Load the corpus before web processes are forked (see run.py), so that
+    they share it copy-on-write instead of each loading it on its first
+    request. Database connections are closed so that they are not shared,
+    and loaded objects are frozen out of garbage collection, which would
+    otherwise copy their memory pages in every process.
+
+    :return:    True if loaded, False if database could not be read
+    :rtype:     bool
+    """
+
+    try:
+        with app.app_context():
+            get_corpus()
+            db.session.remove()
+    except SQLAlchemyError as e:
+        app.logger.error('Corpus not preloaded: %s', e)
+        return False
+    finally:
+        db.engine.dispose()
+    gc.freeze()
+    return True
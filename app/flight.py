@@ -0,0 +1,170 @@
+# -*- coding: ascii -*-
+"""
+app.flight
+~~~~~~~~~~
+
+Single-flight coalescing of identical concurrent computations, across
+threads and, through lock files, across processes.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from .utils import private_folder, open_private
+
+__all__ = ['SingleFlight', 'flight_key']
+
+# Seconds between removals of expired files
+PRUNE_INTERVAL = 60
+
+# Seconds between attempts to lock a file held by another process
+POLL_INTERVAL = 0.02
+
+
+def flight_key(*parts):
+    """Hash of parts of a computation, used as its key"""
+    return hashlib.sha256('\0'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs a computation once for concurrent identical requests. The first
+    request computes the result while holding a lock, others wait for the
+    lock and read the result it stored. Results are kept for ttl seconds
+    in files of a local folder only accessible by the current user, so that
+    they are shared with other worker processes (lock files need fcntl,
+    else only threads are coalesced).
+    """
+
+    def __init__(self, path, ttl=10, wait=30):
+        """
+        :param path:    folder of lock and result files, created if missing
+        :type path:     str
+        :param ttl:     seconds results are shared after being computed
+        :type ttl:      int or float
+        :param wait:    maximum seconds to wait for another request
+        :type wait:     int or float
+        """
+        self.path = path
+        self.ttl = ttl
+        self.wait = wait
+        self._locks = {}
+        self._guard = threading.Lock()
+        self._pruned = time.time()
+        private_folder(path)
+
+    def _thread_lock(self, key):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry
+
+    def _release_thread_lock(self, key, entry):
+        with self._guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def _read(self, key):
+        """Returns stored result of key if not expired, else None"""
+        try:
+            with open(os.path.join(self.path, key + '.json')) as fp:
+                stored = json.load(fp)
+        except (IOError, ValueError):
+            return None
+        return stored if time.time() - stored['time'] < self.ttl else None
+
+    def _write(self, key, result):
+        """Store result of key, results are not stored if folder is not writable"""
+        target = os.path.join(self.path, key + '.json')
+        tmp = '%s.%d.%d.tmp' % (target, os.getpid(), threading.get_ident())
+        try:
+            with open_private(tmp) as fp:
+                json.dump({'time': time.time(), 'result': result}, fp)
+            os.replace(tmp, target)
+        except OSError:
+            pass
+
+    def _lock_file(self, key, timeout):
+        """Lock file of key, returns its file object, or None if not locked before timeout"""
+
+        try:
+            fp = open_private(os.path.join(self.path, key + '.lock'), 'a')
+        except OSError:
+            return None
+        end = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.utime(fp.name)
+                return fp
+            except BlockingIOError:
+                if time.monotonic() > end:
+                    fp.close()
+                    return None
+                time.sleep(POLL_INTERVAL)
+
+    def prune(self):
+        """Remove expired result files and unused lock files"""
+
+        now = time.time()
+        self._pruned = now
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if now - os.path.getmtime(path) > max(self.ttl, self.wait) * 10:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def do(self, key, func, share=None, wait=None):
+        """
+        Compute result of func, or wait for an identical computation in progress
+
+        :param key:     key of computation, see flight_key()
+        :type key:      str
+        :param func:    computation without arguments, returning a JSON serializable result
+        :type func:     callable
+        :param share:   function telling whether a result may be shared, default is always
+        :type share:    callable or None
+        :param wait:    maximum seconds to wait for another request, default is wait of flight
+        :type wait:     int or float or None
+        :return:        result, decoded from JSON if computed by another request
+        """
+
+        wait = self.wait if wait is None else max(wait, 0)
+        entry = self._thread_lock(key)
+        try:
+            if not entry[0].acquire(timeout=wait):
+                return func()
+            try:
+                stored = self._read(key)
+                if stored is not None:
+                    return stored['result']
+
+                fp = self._lock_file(key, wait) if fcntl is not None else None
+                try:
+                    stored = self._read(key) if fp is not None else None
+                    if stored is not None:
+                        return stored['result']
+
+                    result = func()
+                    if share is None or share(result):
+                        self._write(key, result)
+                    return result
+                finally:
+                    if fp is not None:
+                        fp.close()
+            finally:
+                entry[0].release()
+        finally:
+            self._release_thread_lock(key, entry)
+            if time.time() - self._pruned > PRUNE_INTERVAL:
+                self.prune()
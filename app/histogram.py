@@ -0,0 +1,90 @@
+# -*- coding: ascii -*-
+"""
+app.histogram
+~~~~~~~~~~~~~
+
+Character histogram filter of citations, rejecting citations too far
+from an input citation with one vectorized operation before their edit
+distance is computed. Needs NumPy, which is optional.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['HistogramFilter', 'histograms']
+
+# Characters counted in their own column, other characters share the last column
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789 .,()-:;&/\''
+
+# Column of each character code below 256, codes above share the last column
+if np is not None:
+    _COLUMNS = np.full(256, len(ALPHABET), dtype=np.intp)
+    _COLUMNS[[ord(c) for c in ALPHABET]] = np.arange(len(ALPHABET))
+
+# Maximum count of a character, larger counts are clipped (bounds stay valid)
+_MAX_COUNT = np.iinfo(np.int16).max if np is not None else None
+
+
+def histograms(values):
+    """
+    Character histograms of texts
+
+    :param values:  normalized texts
+    :type values:   list or tuple
+    :return:        matrix of character counts, one row per text, and vector of text lengths
+    :rtype:         tuple
+    """
+
+    width = len(ALPHABET) + 1
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int32, count=len(values))
+    codes = np.frombuffer(''.join(values).encode('utf-32-le'), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(values)), lengths)
+    cells = rows * width + _COLUMNS[np.minimum(codes, 255)]
+    counts = np.bincount(cells, minlength=len(values) * width).reshape(len(values), width)
+    return np.minimum(counts, _MAX_COUNT).astype(np.int16), lengths
+
+
+class HistogramFilter:
+    """
+    Lower bounds of edit distances by character histograms. An edit
+    changes the count of at most two characters by one, so the edit
+    distance of two texts is at least the largest of the total surplus
+    and the total deficit of their counts, i.e. half the sum of the L1
+    distance of their histograms and of their length difference.
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: citations with normalized attribute
+        :type entries:  list
+        """
+        self.entries = entries
+        self._counts, self._lengths = histograms([e.normalized for e in entries])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bounds(self, value):
+        """Lower bounds of edit distances between normalized text and each citation"""
+        counts, lengths = histograms([value])
+        l1 = np.abs(self._counts - counts[0]).sum(axis=1, dtype=np.int32)
+        return (l1 + np.abs(self._lengths - lengths[0])) // 2
+
+    def candidates(self, value, max_distance):
+        """
+        Filter citations which may be within max_distance of normalized text
+
+        :param value:           normalized text
+        :type value:            str
+        :param max_distance:    maximum edit distance
+        :type max_distance:     int
+        :return:                citations not rejected, in their order
+        :rtype:                 list
+        """
+
+        if not self.entries:
+            return []
+        entries = self.entries
+        return [entries[i] for i in np.flatnonzero(self.bounds(value) <= max_distance)]
@@ -0,0 +1,188 @@
+# -*- coding: ascii -*-
+"""
+app.jobs
+~~~~~~~~
+
+Durable queue of citation checks, stored in a local SQLite database
+and processed by workers outside of the web processes.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+from contextlib import closing
+from .utils import private_folder, open_private
+
+__all__ = ['QUEUED', 'RUNNING', 'DONE', 'FAILED', 'JobQueue']
+
+#: Job is waiting for a worker
+QUEUED = 'queued'
+
+#: Job is being processed by a worker
+RUNNING = 'running'
+
+#: Job is processed, result is available
+DONE = 'done'
+
+#: Job processing failed
+FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+'''
+
+
+class JobQueue:
+    """
+    Job queue backed by a SQLite database file, safe across processes.
+    Submitted texts are stored, so the file is created only readable by
+    the current user, in a folder only accessible by it.
+    """
+
+    def __init__(self, path, timeout=600, max_attempts=3):
+        """
+        :param path:            path to SQLite database file
+        :type path:             str
+        :param timeout:         seconds after which a running job is considered
+                                abandoned (worker died) and is queued again
+        :type timeout:          int or float
+        :param max_attempts:    number of times a job is processed before being marked
+                                as failed if its workers die
+        :type max_attempts:     int
+        :raises:                OSError if folder of file is not private (see private_folder())
+        """
+        self.path = path
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        private_folder(os.path.dirname(os.path.abspath(path)))
+        open_private(path, 'a').close()
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+            # Queues created before attempts were counted
+            if 'attempts' not in {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}:
+                conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, data):
+        """
+        Add a job into the queue
+
+        :param data:    submitted text to be checked
+        :type data:     str
+        :return:        job ID
+        :rtype:         str
+        """
+
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, data, created) VALUES (?, ?, ?, ?)',
+                (job_id, QUEUED, data, time.time())
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest queued (or abandoned) job for processing. Abandoned
+        jobs processed max_attempts times already are marked as failed.
+
+        :return:    tuple of (job ID, data), or None if queue is empty
+        :rtype:     tuple or None
+        """
+
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? '
+                'WHERE status = ? AND started < ? AND attempts >= ?',
+                (FAILED, 'Processing was interrupted %d times' % self.max_attempts, now,
+                 RUNNING, now - self.timeout, self.max_attempts)
+            )
+            row = conn.execute(
+                'SELECT id, data FROM jobs WHERE status = ? OR (status = ? AND started < ?) '
+                'ORDER BY created LIMIT 1',
+                (QUEUED, RUNNING, now - self.timeout)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE id = ?',
+                         (RUNNING, now, row['id']))
+            conn.execute('COMMIT')
+            return row['id'], row['data']
+
+    def finish(self, job_id, result):
+        """Store result of a processed job, result must be JSON serializable"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, finished = ? WHERE id = ?',
+                (DONE, json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """Mark a job as failed with its error message"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                (FAILED, str(error), time.time(), job_id)
+            )
+
+    def get(self, job_id, with_data=False):
+        """
+        Returns status of a job
+
+        :param job_id:      job ID
+        :type job_id:       str
+        :param with_data:   also return submitted data of the job, default is False
+        :type with_data:    bool
+        :return:            dict of id, status, position (if queued), result (if done)
+                            and error (if failed), or None if job is not found
+        :rtype:             dict or None
+        """
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT id, status, data, result, error, created FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            ret = {'id': row['id'], 'status': row['status']}
+            if with_data:
+                ret['data'] = row['data']
+            if row['status'] == QUEUED:
+                ret['position'] = conn.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?', (QUEUED, row['created'])
+                ).fetchone()[0]
+            elif row['status'] == DONE:
+                ret['result'] = json.loads(row['result'])
+            elif row['status'] == FAILED:
+                ret['error'] = row['error']
+            return ret
+
+    def purge(self, age):
+        """Delete finished jobs older than age (in seconds)"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?', (DONE, FAILED, time.time() - age)
+            )
@@ -0,0 +1,136 @@
+# -*- coding: ascii -*-
+"""
+app.lsh
+~~~~~~~
+
+MinHash signatures and LSH banding index for finding near-duplicate citations.
+"""
+
+import math
+import random
+import struct
+from zlib import crc32
+from collections import defaultdict
+from .utils import normalize
+
+__all__ = [
+    'NUM_PERMUTATIONS',
+    'minhash',
+    'pack_signature',
+    'unpack_signature',
+    'relative_distance',
+    'LSHIndex'
+]
+
+#: Number of hash permutations (length of signature)
+NUM_PERMUTATIONS = 64
+
+#: Size of character shingles
+SHINGLE_SIZE = 3
+
+# Mersenne prime used for universal hashing, fits into 32 bits
+_PRIME = (1 << 31) - 1
+
+# Fixed seeded permutations, signatures must be the same across processes
+_rng = random.Random(0x7ec17e)
+_PERMUTATIONS = tuple(
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+)
+
+# Binary format of a packed signature
+_SIGNATURE_FORMAT = '<%dI' % NUM_PERMUTATIONS
+
+
+def shingles(text):
+    """
+    Generate set of hashed character shingles from normalized text
+
+    :param text:    input text
+    :type text:     str
+    :return:        set of shingle hashes
+    :rtype:         set
+    """
+
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {crc32(text.encode())}
+    return {crc32(text[i:i + SHINGLE_SIZE].encode()) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """
+    Compute MinHash signature of text
+
+    :param text:    input text
+    :type text:     str
+    :return:        signature with NUM_PERMUTATIONS values
+    :rtype:         tuple
+    """
+
+    hashes = shingles(text)
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def pack_signature(signature):
+    """Pack signature into bytes for storing in database"""
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack_signature(data):
+    """Unpack signature from bytes stored in database"""
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def relative_distance(text, ratio, min_distance):
+    """
+    Maximum edit distance allowed for text, relative to its normalized length
+
+    :param text:            input text
+    :type text:             str
+    :param ratio:           maximum ratio of edits to text length
+    :type ratio:            float
+    :param min_distance:    lower limit of edit distance
+    :type min_distance:     int
+    :return:                maximum edit distance
+    :rtype:                 int
+    """
+    return max(min_distance, int(math.floor(ratio * len(normalize(text)))))
+
+
+class LSHIndex:
+    """Banding index over MinHash signatures"""
+
+    def __init__(self, bands):
+        if NUM_PERMUTATIONS % bands:
+            raise ValueError('Number of bands must divide %d' % NUM_PERMUTATIONS)
+        self._rows = NUM_PERMUTATIONS // bands
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+
+    def _bands(self, signature):
+        for i, buckets in enumerate(self._buckets):
+            yield buckets, signature[i * self._rows:(i + 1) * self._rows]
+
+    def add(self, item, signature):
+        """Add item with its signature into the index"""
+        for buckets, band in self._bands(signature):
+            buckets[band].append(item)
+
+    def query(self, signature):
+        """
+        Find items sharing at least one band with the signature
+
+        :param signature:   MinHash signature
+        :type signature:    tuple
+        :return:            list of candidate items
+        :rtype:             list
+        """
+
+        seen = set()
+        ret = []
+        for buckets, band in self._bands(signature):
+            for item in buckets.get(band, ()):
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    ret.append(item)
+        return ret
@@ -8,7 +8,19 @@ Contains all the model objects and their schemas.
 
 from . import db
 
-__all__ = ['Article', 'Citation']
+__all__ = ['Article', 'Citation', 'Metadata', 'citation_articles', 'GENERATION']
+
+#: key of metadata holding the generation of stored citations, a hash of their
+#: content written by freshdb.py
+GENERATION = 'generation'
+
+#: Association of citations to all articles rendering to them, as duplicate
+#: citations are stored once
+citation_articles = db.Table(
+    'citation_articles',
+    db.Column('citation_id', db.Integer, db.ForeignKey('citations.id'), primary_key=True),
+    db.Column('article_id', db.Integer, db.ForeignKey('retracted_articles.id'), primary_key=True)
+)
 
 
 class Article(db.Model):
@@ -54,6 +66,8 @@ class Article(db.Model):
     index = db.Column(db.Integer)
     #: DOI value, optional
     doi = db.Column(db.String)
+    #: normalized DOI value (see doi_normalize), indexed for lookups of DOIs of checked citations, optional
+    normalized_doi = db.Column(db.String, index=True)
     #: list of citations generated for this article, referred to 'citations' table
     citations = db.relationship('Citation', backref='article', lazy=True)
 
@@ -70,10 +84,40 @@ class Citation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     #: value of citation as unicode string, required
     value = db.Column(db.Text, nullable=False)
+    #: normalized value of citation (see normalize), computed at ingest, optional
+    normalized = db.Column(db.Text)
     #: Citation format name
     type = db.Column(db.String, nullable=False)
+    #: packed MinHash signature of the citation, computed at ingest, optional
+    signature = db.Column(db.LargeBinary)
+    #: name of variant if citation is a variant of a generated citation, else None
+    variant = db.Column(db.String)
     #: a reference to the article to which the citation belongs to
     article_id = db.Column(db.Integer, db.ForeignKey('retracted_articles.id'), nullable=False)
+    #: list of all articles rendering to this citation
+    articles = db.relationship('Article', secondary=citation_articles, lazy=True,
+                               backref=db.backref('shared_citations', lazy=True))
+
+    #: trigram index of normalized values on PostgreSQL (needs pg_trgm extension), used by 'trigram' index
+    __table_args__ = (
+        db.Index('ix_citations_normalized_trgm', 'normalized', postgresql_using='gin',
+                 postgresql_ops={'normalized': 'gin_trgm_ops'}),
+    )
+
+    def __repr__(self):
+        return '<Citation value=%r, type=%r, variant=%r, article_id=%r>' % (
+            self.value, self.type, self.variant, self.article_id)
+
+
+class Metadata(db.Model):
+    """A named value describing the data stored in database"""
+
+    #: table name in database
+    __tablename__ = 'metadata'
+    #: name of value, primary key
+    key = db.Column(db.String, primary_key=True)
+    #: value, required
+    value = db.Column(db.String, nullable=False)
 
     def __repr__(self):
-        return '<Citation value=%r, type=%r, article_id=%r>' % (self.value, self.type, self.article_id)
+        return '<Metadata %r=%r>' % (self.key, self.value)
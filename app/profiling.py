@@ -0,0 +1,158 @@
+# -*- coding: ascii -*-
+"""
+app.profiling
+~~~~~~~~~~~~~
+
+Opt-in profiling of slow requests and memory snapshots.
+"""
+
+import os
+import time
+import hmac
+import cProfile
+import tracemalloc
+from functools import wraps
+from flask import request, abort, Response
+from . import app
+
+__all__ = ['profiled', 'rotate_profiles', 'memory_report']
+
+# Allocations hidden from memory snapshots
+_IGNORED_FILES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>')
+)
+
+# Last memory snapshot of this process, used for comparisons
+_last_snapshot = None
+
+# Start tracing early, so that the corpus is traced as well
+if app.config['TRACEMALLOC_FRAMES']:
+    tracemalloc.start(app.config['TRACEMALLOC_FRAMES'])
+
+
+def rotate_profiles(path, keep):
+    """
+    Remove oldest profile dumps
+
+    :param path:    folder of profile dumps
+    :type path:     str
+    :param keep:    number of most recent dumps kept
+    :type keep:     int
+    """
+
+    dumps = [os.path.join(path, name) for name in os.listdir(path) if name.endswith('.pstats')]
+    dumps.sort(key=os.path.getmtime, reverse=True)
+    for dump in dumps[keep:]:
+        try:
+            os.remove(dump)
+        except OSError:
+            pass
+
+
+def profiled(name):
+    """
+    Decorator profiling function calls with cProfile if PROFILE_THRESHOLD is set.
+    Profiles of calls lasting longer than the threshold are dumped into PROFILE_DIR
+    as '<name>-<time>-<pid>-<ms>.pstats' files, which can be read by pstats or snakeviz.
+
+    :param name:    name of profiled function used in dump file names
+    :type name:     str
+    :return:        decorator
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            threshold = app.config['PROFILE_THRESHOLD']
+            if threshold is None:
+                return func(*args, **kwargs)
+
+            # Only one profiler can be active at a time on some Python versions
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                elapsed = time.perf_counter() - start
+                if elapsed > threshold:
+                    path = app.config['PROFILE_DIR']
+                    os.makedirs(path, exist_ok=True)
+                    profile.dump_stats(os.path.join(path, '%s-%s-%d-%d.pstats' % (
+                        name, time.strftime('%Y%m%d%H%M%S'), os.getpid(), elapsed * 1000)))
+                    rotate_profiles(path, app.config['PROFILE_KEEP'])
+                    app.logger.warning('Slow %s took %.0f ms, profile saved', name, elapsed * 1000)
+        return wrapper
+    return decorator
+
+
+def memory_report(top=20, key='lineno', compare=False):
+    """
+    Report largest memory allocations traced by tracemalloc
+
+    :param top:     number of allocation sites reported
+    :type top:      int
+    :param key:     grouping of allocations, 'lineno', 'filename' or 'traceback'
+    :type key:      str
+    :param compare: report growth since the previous report of this process
+    :type compare:  bool
+    :return:        report as plain text
+    :rtype:         str
+    """
+
+    global _last_snapshot
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_FILES)
+    if compare and _last_snapshot is not None:
+        stats = snapshot.compare_to(_last_snapshot, key)
+    else:
+        stats = snapshot.statistics(key)
+    _last_snapshot = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ['Process %d: %.1f MiB traced, %.1f MiB peak' % (os.getpid(), current / 2 ** 20, peak / 2 ** 20), '']
+    for stat in stats[:top]:
+        lines.append(str(stat))
+        if key == 'traceback':
+            lines.extend(stat.traceback.format())
+    return '\n'.join(lines) + '\n'
+
+
+@app.route('/admin/memory')
+def memory():
+    """
+    Top memory allocations of the process serving the request, plain text.
+    Available only if ADMIN_TOKEN is set; the token is given in the
+    X-Admin-Token header. Tracing starts with the first request unless
+    TRACEMALLOC_FRAMES is set, so corpus allocations may be missing.
+
+    Query arguments:
+        top:        number of allocation sites, default is 20
+        key:        grouping of allocations (lineno, filename, traceback)
+        compare:    if 1, report growth since the previous request
+    """
+
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        abort(403)
+
+    key = request.args.get('key', 'lineno')
+    if key not in ('lineno', 'filename', 'traceback'):
+        abort(400, 'Unsupported key: %s' % key)
+    top = request.args.get('top', 20, type=int)
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(app.config['TRACEMALLOC_FRAMES'] or 1)
+
+    report = memory_report(top=top, key=key, compare=request.args.get('compare') == '1')
+    return Response(report, mimetype='text/plain', headers={'Cache-Control': 'no-store'})
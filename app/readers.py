@@ -0,0 +1,292 @@
+# -*- coding: ascii -*-
+"""
+app.readers
+~~~~~~~~~~~
+
+Incremental readers for bibliography files (plain text, RIS and BibTeX).
+"""
+
+import re
+import time
+import codecs
+from itertools import chain
+from collections import namedtuple
+from styles import APA
+from .utils import ParsedCitation, parse_citations, normalize
+
+__all__ = ['Reference', 'FORMATS', 'InputLimit', 'iter_lines', 'read_references']
+
+#: A reference read from a bibliography, with its DOI if known
+Reference = namedtuple('Reference', 'citation doi')
+
+# Find RIS tag and its value
+find_ris_tag = re.compile(r'^([A-Z][A-Z0-9])  -(?: (.*))?$').findall
+
+# Find BibTeX field name
+find_bib_field = re.compile(r'\s*,?\s*([\w-]+)\s*=\s*').match
+
+# Find LaTeX commands in BibTeX values
+sub_latex = re.compile(r'\\[a-zA-Z]+\s*|\\\W|[{}]').sub
+
+# Find end of bare BibTeX value
+find_bare_end = re.compile(r'[,}]').search
+
+# Find page range
+find_pages = re.compile(r'^\s*(\w+)(?:\s*-+\s*(\w+))?').findall
+
+# Split BibTeX authors
+split_authors = re.compile(r'\s+and\s+').split
+
+# Find given names
+find_given = re.compile(r'[^\W\d_]').findall
+
+
+class InputLimit(ValueError):
+    """Input stream is larger, or takes longer to be read, than allowed"""
+
+
+def iter_lines(stream, chunk_size=8192, max_size=65536, max_total=None, deadline=None):
+    """
+    Read lines from a binary stream incrementally
+
+    :param stream:      input stream with read() method
+    :param chunk_size:  number of bytes read at once
+    :type chunk_size:   int
+    :param max_size:    maximum length of a line, longer lines are split
+    :type max_size:     int
+    :param max_total:   maximum number of bytes read, None for no limit
+    :type max_total:    int or None
+    :param deadline:    time.monotonic() value after which no more bytes are read, None for no limit
+    :type deadline:     float or None
+    :return:            generator of decoded lines
+    :raises:            InputLimit if stream is larger than max_total or is not read before deadline
+    """
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    rest = ''
+    total = 0
+    while True:
+        if deadline is not None and time.monotonic() > deadline:
+            raise InputLimit('Input was not read in time')
+        chunk = stream.read(chunk_size)
+        total += len(chunk)
+        if max_total is not None and total > max_total:
+            raise InputLimit('Input is larger than %d bytes' % max_total)
+        lines = (rest + decoder.decode(chunk, final=not chunk)).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+        while len(rest) > max_size:
+            yield rest[:max_size]
+            rest = rest[max_size:]
+        if not chunk:
+            break
+    if rest:
+        yield rest
+
+
+def to_author(name):
+    """Convert author name ('Last, First M.' or 'First M. Last') into 'Last, FM' format"""
+
+    name = normalize(name, case=False)
+    if ',' in name:
+        surname, _, given = name.partition(',')
+    else:
+        given, _, surname = name.rpartition(' ')
+    surname = surname.strip().replace(' ', '-')
+    initials = ''.join(find_given(given)[:1] + [i[0] for i in given.split()[1:] if i[:1].isalpha()])
+    return '%s, %s' % (surname, initials.upper()) if initials else surname
+
+
+def to_reference(authors, title, journal, year, volume, issue, pages, doi):
+    """Format structured reference fields into an APA citation"""
+
+    begin_page, end_page = (find_pages(pages or '') or [('', '')])[0]
+    citation = APA(
+        author='; '.join(to_author(a) for a in authors if a.strip()),
+        group_author='',
+        article_title=title,
+        pub_name=journal,
+        pub_date='',
+        pub_year=year,
+        volume=volume,
+        issue=issue,
+        special_issue='',
+        begin_page=begin_page,
+        end_page=end_page
+    ).journal
+    return Reference(ParsedCitation(citation, 'apa'), doi or None) if citation else None
+
+
+def read_text(lines, max_size):
+    """Read citations from paragraphs of plain text"""
+
+    paragraph = []
+    size = 0
+    for line in chain(lines, ['']):
+        if line.strip() and size < max_size:
+            paragraph.append(line)
+            size += len(line)
+            continue
+        if paragraph:
+            for citation in parse_citations('\n'.join(paragraph)):
+                yield Reference(citation, None)
+        paragraph = [line] if line.strip() else []
+        size = len(line)
+
+
+def read_ris(lines, max_size):
+    """Read references from RIS records"""
+
+    record = {}
+    size = 0
+    for line in lines:
+        found = find_ris_tag(line)
+        if not found:
+            continue
+        tag, value = found[0]
+        if tag == 'TY':
+            record = {}
+            size = 0
+        elif tag == 'ER':
+            ref = to_reference(
+                authors=record.get('AU', []) + record.get('A1', []),
+                title=first(record, 'TI', 'T1'),
+                journal=first(record, 'JO', 'JF', 'T2', 'JA'),
+                year=first(record, 'PY', 'Y1', 'DA')[:4],
+                volume=first(record, 'VL'),
+                issue=first(record, 'IS'),
+                pages='-'.join(i for i in (first(record, 'SP'), first(record, 'EP')) if i),
+                doi=first(record, 'DO')
+            )
+            if ref:
+                yield ref
+            record = {}
+        elif size < max_size:
+            record.setdefault(tag, []).append(value.strip())
+            size += len(value)
+
+
+def first(record, *tags):
+    """Returns first value of tags found in record or empty"""
+    for tag in tags:
+        if record.get(tag):
+            return record[tag][0]
+    return ''
+
+
+def parse_bib_fields(body):
+    """Parse fields of a BibTeX entry body (after citation key)"""
+
+    fields = {}
+    pos = 0
+    while True:
+        found = find_bib_field(body, pos)
+        if not found:
+            break
+        name = found.group(1).lower()
+        pos = found.end()
+        if body[pos:pos + 1] == '{':
+            depth, end = 0, pos
+            for end in range(pos, len(body)):
+                depth += {'{': 1, '}': -1}.get(body[end], 0)
+                if not depth:
+                    break
+            value, pos = body[pos + 1:end], end + 1
+        elif body[pos:pos + 1] == '"':
+            end = body.find('"', pos + 1)
+            end = len(body) if end < 0 else end
+            value, pos = body[pos + 1:end], end + 1
+        else:
+            end = find_bare_end(body, pos)
+            end = end.start() if end else len(body)
+            value, pos = body[pos:end], end
+        fields[name] = ' '.join(sub_latex('', value).split())
+    return fields
+
+
+def read_bibtex(lines, max_size):
+    """Read references from BibTeX entries"""
+
+    entry = []
+    depth = 0
+    size = 0
+    for line in lines:
+        if not entry:
+            if not line.lstrip().startswith('@'):
+                continue
+            depth = 0
+            size = 0
+        if size < max_size:
+            entry.append(line)
+            size += len(line)
+        depth += line.count('{') - line.count('}')
+        if depth > 0:
+            continue
+
+        text = '\n'.join(entry)
+        entry = []
+        kind, _, body = text.partition('{')
+        if kind.strip().lower() in ('@comment', '@preamble', '@string'):
+            continue
+        fields = parse_bib_fields(body.partition(',')[2])
+        ref = to_reference(
+            authors=split_authors(fields.get('author', '')),
+            title=fields.get('title', ''),
+            journal=fields.get('journal', fields.get('booktitle', '')),
+            year=fields.get('year', ''),
+            volume=fields.get('volume', ''),
+            issue=fields.get('number', ''),
+            pages=fields.get('pages', ''),
+            doi=fields.get('doi', '')
+        )
+        if ref:
+            yield ref
+
+
+#: Readers of supported bibliography formats
+FORMATS = {
+    'txt': read_text,
+    'ris': read_ris,
+    'bib': read_bibtex
+}
+
+
+def sniff_format(line):
+    """Guess bibliography format from its first non-blank line"""
+    if line.lstrip().startswith('@'):
+        return 'bib'
+    if find_ris_tag(line):
+        return 'ris'
+    return 'txt'
+
+
+def read_references(lines, fmt=None, max_size=65536):
+    """
+    Read references one by one from lines of a bibliography
+
+    :param lines:       iterable of lines
+    :param fmt:         format of bibliography (txt, ris or bib), guessed if None (txt if blank)
+    :type fmt:          str or None
+    :param max_size:    maximum size of an entry, the rest of it is ignored
+    :type max_size:     int
+    :return:            generator of references
+    """
+
+    lines = iter(lines)
+    if fmt is None:
+        head = []
+        for line in lines:
+            head.append(line)
+            if line.strip():
+                fmt = sniff_format(line)
+                break
+        lines = chain(head, lines)
+
+        # Empty or blank bibliography, read as plain text without references
+        fmt = fmt or 'txt'
+
+    if fmt not in FORMATS:
+        raise ValueError('Unsupported bibliography format: %s' % fmt)
+
+    return FORMATS[fmt](lines, max_size)
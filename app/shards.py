@@ -0,0 +1,147 @@
+# -*- coding: ascii -*-
+"""
+app.shards
+~~~~~~~~~~
+
+Matching citations by shards of the corpus, served by matcher.py processes.
+"""
+
+import json
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from . import app
+from .corpus import get_corpus
+from .utils import ParsedCitation, CITATION_STYLES
+
+__all__ = ['ShardError', 'match_shard', 'scatter', 'make_shard_server']
+
+
+class ShardError(Exception):
+    """A shard failed to match citations, or answered for a wrong shard"""
+
+
+def match_shard(citations, max_distance, shard):
+    """
+    Match citations against a shard of the corpus
+
+    :param citations:       input citations
+    :type citations:        list
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :param shard:           (index, count) of the shard
+    :type shard:            tuple
+    :return:                (edit distance, article ID) of closest citation, or None, for each citation
+    :rtype:                 list
+    """
+
+    corpus = get_corpus(shard=shard)
+    return [corpus.closest(citation, max_distance) for citation in citations]
+
+
+def query_shard(url, citations, max_distance, timeout):
+    """Post citations to a shard, returns its decoded response"""
+
+    body = json.dumps({
+        'citations': citations,
+        'styles': [getattr(citation, 'style', None) for citation in citations],
+        'max_distance': max_distance
+    }).encode('utf-8')
+    req = urllib.request.Request(url.rstrip('/') + '/match', data=body,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+    except (OSError, ValueError) as e:
+        raise ShardError('Shard %s failed: %s' % (url, e))
+
+
+def scatter(urls, citations, max_distance, timeout):
+    """
+    Match citations by all shards in parallel, and merge their closest matches
+
+    :param urls:            URLs of shards, shard i of n at index i
+    :type urls:             list
+    :param citations:       input citations
+    :type citations:        list
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :param timeout:         seconds to wait for each shard
+    :type timeout:          float
+    :return:                (edit distance, article ID) of closest citation, or None, for each citation
+    :rtype:                 list
+    """
+
+    if not citations:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        responses = list(executor.map(lambda url: query_shard(url, citations, max_distance, timeout), urls))
+
+    ret = [None] * len(citations)
+    for i, (url, resp) in enumerate(zip(urls, responses)):
+        if resp.get('shard') != [i, len(urls)] or len(resp.get('results', ())) != len(citations):
+            raise ShardError('Shard %s does not serve shard %d of %d' % (url, i, len(urls)))
+        for j, found in enumerate(resp['results']):
+            if found is not None and (ret[j] is None or found[0] < ret[j][0]):
+                ret[j] = tuple(found)
+    return ret
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+    """Answers match requests of the web processes for one shard"""
+
+    #: (index, count) of the served shard
+    shard = None
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json({'error': 'Not found'}, 404)
+        with app.app_context():
+            corpus = get_corpus(shard=self.shard)
+            self.send_json({'shard': list(self.shard), 'generation': corpus.generation, 'citations': len(corpus)})
+
+    def do_POST(self):
+        if self.path != '/match':
+            return self.send_json({'error': 'Not found'}, 404)
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            styles = data.get('styles') or [None] * len(data['citations'])
+            citations = [ParsedCitation(c, s if s in CITATION_STYLES else None)
+                         for c, s in zip(data['citations'], styles)]
+            max_distance = int(data.get('max_distance', app.config['MAX_EDIT_DISTANCE']))
+        except (ValueError, KeyError, TypeError):
+            return self.send_json({'error': 'Invalid request'}, 400)
+
+        with app.app_context():
+            results = match_shard(citations, max_distance, self.shard)
+        self.send_json({'shard': list(self.shard), 'results': results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_shard_server(host, port, shard):
+    """
+    Create HTTP server of a shard
+
+    :param host:    listening address
+    :type host:     str
+    :param port:    listening port
+    :type port:     int
+    :param shard:   (index, count) of the shard
+    :type shard:    tuple
+    :return:        server, not started yet
+    :rtype:         ThreadingHTTPServer
+    """
+
+    handler = type('ShardHandler', (ShardHandler,), {'shard': tuple(shard)})
+    return ThreadingHTTPServer((host, port), handler)
@@ -1,10 +1,116 @@
 var $backdrop = $('.backdrop');
+var $highlights = $('.highlights');
 var $textarea = $('textarea');
 var $citations = $('#citations')
+var $tier = $('#tier');
+
+// Live highlighting while typing, only lines changed since last check are posted
+var recheckUrl = $textarea.data('recheck-url');
+var recheckDelay = 400;
+var recheckTimer = null;
+var recheckPending = false;
+var lineCitations = {};  // line -> list of citation hashes and values
+var matches = {};        // citation hash -> match ('exact', 'approx' or null)
+
+function escapeHtml(text) {
+  return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+}
+
+function renderHighlights() {
+  var lines = $textarea.val().split('\n');
+  var html = lines.map(function(line) {
+    var ret = escapeHtml(line);
+    (lineCitations[line] || []).forEach(function(c) {
+      var matched = matches[c.hash];
+      if (matched) {
+        var citation = escapeHtml(c.citation);
+        ret = ret.split(citation).join('<mark class="' + matched + '-match">' + citation + '</mark>');
+      }
+    });
+    return ret;
+  });
+  $highlights.html(html.join('\n'));
+
+  // Forget lines not in text anymore
+  var current = {};
+  lines.forEach(function(line) { current[line] = true; });
+  Object.keys(lineCitations).forEach(function(line) {
+    if (!current[line]) {
+      delete lineCitations[line];
+    }
+  });
+}
+
+function recheck() {
+  if (recheckPending) {
+    return;
+  }
+
+  var seen = {};
+  var changed = $textarea.val().split('\n').filter(function(line) {
+    var ret = line.trim() && !lineCitations.hasOwnProperty(line) && !seen[line];
+    seen[line] = true;
+    return ret;
+  });
+  if (!changed.length) {
+    renderHighlights();
+    return;
+  }
+
+  recheckPending = true;
+  var tier = $tier.val();
+  $.ajax({
+    url: recheckUrl,
+    method: 'POST',
+    contentType: 'application/json',
+    data: JSON.stringify({paragraphs: changed, known: Object.keys(matches), tier: tier}),
+    dataType: 'json'
+  }).done(function(data) {
+    // Tier changed while checking, results are outdated
+    if (tier !== $tier.val()) {
+      scheduleRecheck();
+      return;
+    }
+    data.paragraphs.forEach(function(found, i) {
+      // Lines with unchecked citations (time budget ran out) are posted again
+      if (!found.some(function(c) { return c.unchecked; })) {
+        lineCitations[changed[i]] = found;
+      }
+      found.forEach(function(c) {
+        if (c.hasOwnProperty('match')) {
+          matches[c.hash] = c.match;
+        }
+      });
+    });
+    scheduleRecheck();
+  }).always(function() {
+    recheckPending = false;
+    renderHighlights();
+  });
+}
+
+function scheduleRecheck() {
+  clearTimeout(recheckTimer);
+  recheckTimer = setTimeout(recheck, recheckDelay);
+}
 
 function handleInput() {
   var text = $textarea.val();
   $citations.val(text)
+  if (recheckUrl) {
+    renderHighlights();
+    scheduleRecheck();
+  }
+}
+
+function handleTierChange() {
+  // Results depend on matching tier, check all lines again
+  lineCitations = {};
+  matches = {};
+  if (recheckUrl) {
+    renderHighlights();
+    scheduleRecheck();
+  }
 }
 
 function handleScroll() {
@@ -20,6 +126,7 @@ function bindEvents() {
     'input': handleInput,
     'scroll': handleScroll
   });
+  $tier.on('change', handleTierChange);
 }
 
-bindEvents();
\ No newline at end of file
+bindEvents();
@@ -0,0 +1,97 @@
+# -*- coding: ascii -*-
+"""
+app.trigram
+~~~~~~~~~~~
+
+Candidate selection by PostgreSQL, using a pg_trgm index of normalized
+citations, for matching without an in-memory corpus.
+"""
+
+import re
+from Levenshtein import distance
+from sqlalchemy import text
+from . import app, db
+from .utils import normalize
+
+__all__ = ['trigrams', 'similarity_bound', 'trigram_closest']
+
+# Words of a text as split by pg_trgm
+find_words = re.compile(r'[a-z0-9]+').findall
+
+# Candidates of all citations of a submission, within length range and similarity bound of
+# each citation. Variants are only matched exactly.
+_CANDIDATES = text('''
+SELECT q.i, c.normalized, c.article_id
+FROM unnest(CAST(:citations AS text[]), CAST(:styles AS text[]), CAST(:bounds AS float8[]))
+    WITH ORDINALITY AS q(value, style, bound, i)
+JOIN citations c ON c.normalized % q.value
+WHERE length(c.normalized) BETWEEN length(q.value) - :max_distance AND length(q.value) + :max_distance
+    AND similarity(c.normalized, q.value) >= q.bound
+    AND (q.style IS NULL OR split_part(c.type, '_', 1) = q.style)
+    AND (c.variant IS NULL OR c.normalized = q.value)
+ORDER BY q.i, c.id
+''')
+
+
+def trigrams(value):
+    """Set of trigrams of a normalized text, as extracted by pg_trgm"""
+    return {word[i:i + 3] for word in ('  %s ' % w for w in find_words(value.lower())) for i in range(len(word) - 2)}
+
+
+def similarity_bound(value, max_distance):
+    """
+    Lower bound of pg_trgm similarity of texts within max_distance of
+    a normalized text. An edit removes at most 3 trigrams of the text
+    and adds at most 4 (when splitting a word).
+
+    :param value:           normalized text
+    :type value:            str
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :return:                similarity bound, between 0 and 1
+    :rtype:                 float
+    """
+
+    n = len(trigrams(value))
+    if not n:
+        return 0.0
+    return max(n - 3 * max_distance, 0) / float(n + 4 * max_distance)
+
+
+def trigram_closest(citations, max_distance):
+    """
+    Match citations against citations stored in PostgreSQL. Candidates
+    are selected by the pg_trgm index in one query, then verified by
+    edit distance.
+
+    :param citations:       input citations
+    :type citations:        list
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :return:                (edit distance, article ID) of closest citation, or None, for each citation
+    :rtype:                 list
+    """
+
+    if not citations:
+        return []
+
+    values = [normalize(citation) for citation in citations]
+    bounds = [max(similarity_bound(value, max_distance), app.config['TRIGRAM_MIN_SIMILARITY']) for value in values]
+
+    # The % operator uses the index with one threshold, the lowest bound of the submission
+    db.session.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+                       {'threshold': str(min(bounds))})
+    rows = db.session.execute(_CANDIDATES, {
+        'citations': values,
+        'styles': [getattr(citation, 'style', None) for citation in citations],
+        'bounds': bounds,
+        'max_distance': max_distance
+    })
+
+    ret = [None] * len(citations)
+    for i, normalized, article_id in rows:
+        d = distance(values[i - 1], normalized)
+        if d <= max_distance and (ret[i - 1] is None or d < ret[i - 1][0]):
+            ret[i - 1] = (d, article_id)
+    db.session.commit()
+    return ret
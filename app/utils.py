@@ -6,20 +6,82 @@ app.utils
 Utils. for the application.
 """
 
+import os
 import re
+import time
 import unicodedata
-from functools import partial
+from itertools import product
 from Levenshtein import distance
 
 __all__ = [
     'parse_db_uri',
+    'private_folder',
+    'open_private',
+    'ParsedCitation',
+    'CITATION_STYLES',
     'parse_citations',
+    'citation_style',
     'parse_doi',
+    'compile_normalizer',
     'normalize',
+    'normalize_all',
     'doi_normalize',
+    'EXACT_MATCH',
+    'APPROX_MATCH',
+    'UNCHECKED',
+    'DOI_TIER',
+    'EXACT_TIER',
+    'FUZZY_TIER',
+    'MATCH_TIERS',
+    'MatchTimeout',
+    'closest_match',
+    'match',
     'matching'
 ]
 
+#: Result of matching when citation is an exact match
+EXACT_MATCH = 'exact'
+
+#: Result of matching when citation is an approximate match
+APPROX_MATCH = 'approx'
+
+#: Result of matching when citation was not checked before deadline
+UNCHECKED = 'unchecked'
+
+#: Matching tier using DOIs only
+DOI_TIER = 'doi'
+
+#: Matching tier using DOIs and normalized citations
+EXACT_TIER = 'exact'
+
+#: Matching tier using DOIs, normalized citations and edit distance
+FUZZY_TIER = 'fuzzy'
+
+#: Matching tiers, from the cheapest
+MATCH_TIERS = (DOI_TIER, EXACT_TIER, FUZZY_TIER)
+
+# Number of citations compared between checks of deadline
+DEADLINE_CHECK_INTERVAL = 512
+
+
+class MatchTimeout(Exception):
+    """Deadline of matching passed"""
+
+
+class ParsedCitation(str):
+    """A citation string carrying the style ('apa' or 'ama') of the parser which found it"""
+
+    def __new__(cls, value, style=None):
+        ret = super().__new__(cls, value)
+        ret.style = style
+        return ret
+
+    def __reduce__(self):
+        return ParsedCitation, (str(self), self.style)
+
+
+#: Styles of citations found by each finder of find_citations
+CITATION_STYLES = ('apa', 'ama')
 
 # Find citations from text
 find_citations = [
@@ -62,13 +124,18 @@ parse_doi = re.compile(
 
 
 def parse_citations(text):
-    """Parse text into list of citations"""
+    """Parse text into list of citations, tagged with their styles"""
     ret = []
-    for finder in find_citations:
-        ret.extend(finder(text))
+    for style, finder in zip(CITATION_STYLES, find_citations):
+        ret.extend(ParsedCitation(citation, style) for citation in finder(text))
     return ret
 
 
+def citation_style(citation_type):
+    """Style of a citation type stored in database, e.g. 'apa' for 'apa_journal'"""
+    return citation_type.partition('_')[0]
+
+
 def parse_db_uri(conf):
     """
     Parse input database config into database URI format
@@ -94,6 +161,10 @@ def parse_db_uri(conf):
     passwd = str(conf.get('passwd', ''))
     driver = str(conf.get('driver', 'postgresql')).lower() or 'postgresql'
 
+    # SQLite database is a local file, dbname is its path
+    if driver.startswith('sqlite'):
+        return '{}:///{}'.format(driver, dbname)
+
     if user and passwd:
         user = '%s:%s@' % (user, passwd)
     elif user:
@@ -110,6 +181,84 @@ def parse_db_uri(conf):
     return '{}://{}{}/{}'.format(driver, user, host, dbname)
 
 
+def private_folder(path):
+    """
+    Create a folder only accessible by the current user, or check that an
+    existing one is, so that other local users can neither read files
+    stored in it nor plant files in it
+
+    :param path:    folder path
+    :type path:     str
+    :return:        folder path
+    :rtype:         str
+    :raises:        OSError if folder is owned by another user or accessible by others
+    """
+
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise PermissionError('Folder %s must be owned by and only accessible by user %d' % (path, os.getuid()))
+    return path
+
+
+def open_private(path, mode='w'):
+    """Open file for writing ('w') or appending ('a'), created readable by the current user only"""
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if mode == 'a' else os.O_TRUNC)
+    return os.fdopen(os.open(path, flags, 0o600), mode)
+
+
+def to_ascii(text):
+    """Convert unicode characters to ascii, dropping characters that cannot be converted"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+
+
+def compile_normalizer(case=True, spaces=True, unicode=True):
+    """
+    Compile a text normalizer for a normalization config.
+    Unicode conversion is skipped for ascii text, which it does not change.
+
+    :param case:    normalize to lower case, default is True
+    :type case:     bool
+    :param spaces:  normalize spaces, default is True
+    :type spaces:   bool
+    :param unicode: convert unicode characters to ascii, default is True
+    :type unicode:  bool
+    :return:        function normalizing input text
+    :rtype:         callable
+    """
+
+    # Stage for ascii text, case and spaces folded together
+    if case and spaces:
+        fold = lambda text: ' '.join(text.lower().split())
+    elif case:
+        fold = str.lower
+    elif spaces:
+        fold = lambda text: ' '.join(text.split())
+    else:
+        fold = str
+
+    if not unicode:
+        return fold
+
+    if case and spaces:
+        # Most common config, stages inlined
+        def normalizer(text):
+            if not text.isascii():
+                text = to_ascii(text)
+            return ' '.join(text.lower().split())
+    else:
+        def normalizer(text):
+            return fold(text if text.isascii() else to_ascii(text))
+
+    return normalizer
+
+
+# Normalizers of all configs, compiled once
+_normalizers = {
+    config: compile_normalizer(*config) for config in product((True, False), repeat=3)
+}
+
+
 def normalize(text, case=True, spaces=True, unicode=True):
     """
     Normalize text
@@ -125,25 +274,26 @@ def normalize(text, case=True, spaces=True, unicode=True):
     :return:        normalized text
     :rtype:         str
     """
+    try:
+        return _normalizers[case, spaces, unicode](text)
+    except KeyError:
+        return _normalizers[bool(case), bool(spaces), bool(unicode)](text)
 
-    # Normalize unicode
-    if unicode:
-        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
-
-    # Normalize case
-    if case:
-        text = text.lower()
 
-    # Normalize spaces
-    if spaces:
-        text = ' '.join(text.split())
+def normalize_all(texts, case=True, spaces=True, unicode=True):
+    """
+    Normalize list of texts in one call, see normalize()
 
-    # Return normalized text
-    return text
+    :param texts:   input texts
+    :type texts:    iterable
+    :return:        list of normalized texts
+    :rtype:         list
+    """
+    return list(map(_normalizers[bool(case), bool(spaces), bool(unicode)], texts))
 
 
 # Normalize DOI
-doi_normalize = partial(normalize, case=True, spaces=False, unicode=False)
+doi_normalize = compile_normalizer(case=True, spaces=False, unicode=False)
 
 
 def mark_exact(citation):
@@ -156,6 +306,11 @@ def mark_approx(citation):
     return '<mark class="approx-match">%s</mark>' % citation
 
 
+def mark_unchecked(citation):
+    """Highlight citations not checked before deadline"""
+    return '<mark class="unchecked">%s</mark>' % citation
+
+
 def doi_matched(citation, dois):
     """
     Parse DOI value from the input citation, check if the DOI value exists in the list of DOIs
@@ -179,7 +334,7 @@ def doi_matched(citation, dois):
     return False
 
 
-def ld_matched(citation, citations, max_distance):
+def ld_matched(citation, citations, max_distance, deadline=None):
     """
     Is there a match that is less than max_distance?
     Minimum Levenshtein distance between the citation and 
@@ -187,25 +342,124 @@ def ld_matched(citation, citations, max_distance):
 
     :param citation:        input citation
     :type citation:         str
-    :param citations:       list of available citations being matched against
+    :param citations:       list of available citations being matched against, with normalized values
     :type citations:        list or tuple
     :param max_distance:    maximum edit distance
     :type max_distance:     int
+    :param deadline:        time.monotonic() value after which MatchTimeout is raised, default is None
+    :type deadline:         float or None
     :return:                minimum edit distance number if match found, else None
     :rtype:                 int or None
     """
 
-    # Create a generator of edit distance numbers
-    distances = (distance(normalize(citation), normalize(c.value)) for c in citations)
+    # Return min distance of the closest citation, or None
+    found = closest_match(citation, citations, max_distance, deadline=deadline)
+    return found[0] if found else None
 
-    # Filter distance numbers based on input max_distance
-    candidates = filter(lambda x: x <= max_distance, distances)
 
-    # Return min number of filtered distance numbers, or None
-    return min(candidates, default=None)
+def check_deadline(citations, deadline):
+    """Iterate over citations, raise MatchTimeout when deadline passed"""
+    for i, c in enumerate(citations):
+        if not i % DEADLINE_CHECK_INTERVAL and time.monotonic() > deadline:
+            raise MatchTimeout()
+        yield c
+
+
+def closest_match(citation, citations, max_distance, deadline=None):
+    """
+    Find the available citation closest to the citation within max_distance
+
+    :param citation:        input citation
+    :type citation:         str
+    :param citations:       list of available citations being matched against, with normalized values
+    :type citations:        list or tuple
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :param deadline:        time.monotonic() value after which MatchTimeout is raised, default is None
+    :type deadline:         float or None
+    :return:                (edit distance, closest citation) if match found, else None
+    :rtype:                 tuple or None
+    """
+
+    citation = normalize(citation)
+    if deadline is not None:
+        citations = check_deadline(citations, deadline)
+    ret = None
+    for c in citations:
+        d = distance(citation, c.normalized)
+        if d <= max_distance:
+            ret = (d, c)
+            if d == 0:
+                break
+            max_distance = d - 1
+    return ret
+
+
+def exact_matched(citation, exact):
+    """
+    Check if the normalized citation exists in the map of normalized citations
+
+    :param citation:    input citation
+    :type citation:     str
+    :param exact:       map of normalized citations
+    :type exact:        dict or set
+    :return:            True if it exists, else False
+    :rtype:             bool
+    """
+    return normalize(citation) in exact
 
 
-def matching(citation, dois, citations, max_distance):
+def match(citation, dois, citations, max_distance, exact=None, deadline=None, tier=FUZZY_TIER):
+    """
+    Match citation using its DOI, then using its normalized value,
+    then using Levenshtein edit distance, up to matching tier.
+
+    :param citation:        citation for doing matching
+    :type citation:         str
+    :param dois:            list of DOIs
+    :type dois:             set or list or tuple
+    :param citations:       list of available citations, or function of (citation, max_distance)
+                            returning candidate citations and maximum edit distance for them
+    :type citations:        list or tuple or callable
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :param exact:           map of normalized citations, default is None
+    :type exact:            dict or set or None
+    :param deadline:        time.monotonic() value after which MatchTimeout is raised, default is None
+    :type deadline:         float or None
+    :param tier:            last matching step (one of MATCH_TIERS), default is FUZZY_TIER
+    :type tier:             str
+    :return:                EXACT_MATCH, APPROX_MATCH or None if no match found
+    :rtype:                 str or None
+    """
+
+    # Match using DOI
+    if doi_matched(citation, dois):
+        return EXACT_MATCH
+    if tier == DOI_TIER:
+        return None
+
+    # Match using normalized citation
+    if exact is not None and exact_matched(citation, exact):
+        return EXACT_MATCH
+    if tier == EXACT_TIER:
+        return None
+
+    # Select candidate citations
+    if callable(citations):
+        citations, max_distance = citations(citation, max_distance)
+
+    # Match using Levenshtein Edit Distance
+    min_distance = ld_matched(citation, citations, max_distance, deadline=deadline)
+    if min_distance is None:
+        return None  # no match found
+    elif min_distance == 0:
+        return EXACT_MATCH  # exact match
+    else:
+        return APPROX_MATCH  # approx. match
+
+
+def matching(citation, dois, citations, max_distance, exact=None):
     """
     Main function for matching citation. Returns markup based
     on result from matching.
@@ -218,20 +472,15 @@ def matching(citation, dois, citations, max_distance):
     :type citations:        list or tuple
     :param max_distance:    maximum edit distance
     :type max_distance:     int
+    :param exact:           map of normalized citations, default is None
+    :type exact:            dict or set or None
     :return:                markup text for input citation
     :rtype:                 str
     """
 
-    # Match using DOI
-    if doi_matched(citation, dois):
+    matched = match(citation, dois, citations, max_distance, exact=exact)
+    if matched == EXACT_MATCH:
         return mark_exact(citation)
-
-    # Match using Levenshtein Edit Distance
-    else:
-        min_distance = ld_matched(citation, citations, max_distance)
-        if min_distance is None:
-            return citation  # no match found
-        elif min_distance == 0:
-            return mark_exact(citation)  # exact match
-        else:
-            return mark_approx(citation)  # approx. match
+    elif matched == APPROX_MATCH:
+        return mark_approx(citation)
+    return citation  # no match found
@@ -6,63 +6,375 @@ app.views
 Rendering application pages.
 """
 
-from flask import render_template, request, flash
-from . import app
-from .models import Article, Citation
-from .utils import parse_citations, matching, doi_normalize
+import os
+import json
+import time
+import hashlib
+import mimetypes
+from collections import OrderedDict
+from markupsafe import escape
+from sqlalchemy.exc import SQLAlchemyError
+from flask import render_template, request, flash, abort, redirect, url_for, jsonify, Response, \
+    stream_with_context, send_from_directory
+from . import app, db
+from .assets import ASSETS_DIR
+from .models import Article
+from .corpus import get_corpus, loaded_corpus, corpus_generation
+from .admission import Admission, Ticket, Rejected
+from .flight import SingleFlight, flight_key
+from .shards import ShardError, scatter
+from .trigram import trigram_closest
+from .profiling import profiled
+from .jobs import JobQueue, QUEUED, RUNNING, DONE
+from .readers import FORMATS, InputLimit, iter_lines, read_references
+from .utils import parse_citations, parse_doi, match, mark_exact, mark_approx, mark_unchecked, doi_normalize, \
+    doi_matched, EXACT_MATCH, APPROX_MATCH, UNCHECKED, MatchTimeout, DOI_TIER, FUZZY_TIER, MATCH_TIERS
+
+# Markup of matched citations
+MARKS = {
+    EXACT_MATCH: mark_exact,
+    APPROX_MATCH: mark_approx,
+    UNCHECKED: mark_unchecked
+}
+
+# Number of DOIs looked up by a query
+DOI_BATCH_SIZE = 500
+
+# Job queue, created on first use
+_job_queue = None
+
+# Single-flight coalescing of identical checks, created on first use
+_single_flight = None
+
+# Admission control of checks, created on first use
+_admission = None
+
+
+def lookup_dois(values):
+    """
+    Look up DOIs among DOIs of articles, by batches of indexed queries
+
+    :param values:  DOIs, not normalized
+    :type values:   list or tuple
+    :return:        normalized DOIs of articles found, no query is done if no DOI is given
+    :rtype:         set
+    """
+
+    dois = sorted({doi_normalize(value) for value in values if value})
+    ret = set()
+    for i in range(0, len(dois), DOI_BATCH_SIZE):
+        query = db.session.query(Article.normalized_doi).filter(Article.normalized_doi.in_(dois[i:i + DOI_BATCH_SIZE]))
+        ret.update(doi for doi, in query)
+    return ret
+
+
+def citation_dois(citations):
+    """Returns DOIs of citations, as matched by doi_matched()"""
+    return [doi for citation in citations for doi in parse_doi(citation)[:1]]
+
+
+def get_job_queue():
+    """Returns job queue of large checks"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(app.config['JOB_QUEUE_PATH'], timeout=app.config['JOB_TIMEOUT'],
+                              max_attempts=app.config['JOB_MAX_ATTEMPTS'])
+    return _job_queue
+
 
+def remote_matching():
+    """Returns True if citations are matched outside web processes, by matcher shards or by PostgreSQL"""
+    return bool(app.config['MATCHER_SHARDS']) or app.config['MATCH_INDEX'] == 'trigram'
 
-def highlight_matches(text):
+
+def match_remote(citations, dois, max_distance):
+    """
+    Match citations by matcher shards (see matcher.py), or by PostgreSQL
+    with 'trigram' index, except those matched by DOI
+
+    :param citations:       input citations
+    :type citations:        list
+    :param dois:            normalized DOIs of articles
+    :type dois:             set
+    :param max_distance:    maximum edit distance
+    :type max_distance:     int
+    :return:                EXACT_MATCH, APPROX_MATCH or None for each citation
+    :rtype:                 list
+    """
+
+    ret = [EXACT_MATCH if doi_matched(citation, dois) else None for citation in citations]
+    pending = [i for i, matched in enumerate(ret) if matched is None]
+    if app.config['MATCHER_SHARDS']:
+        found = scatter(app.config['MATCHER_SHARDS'], [citations[i] for i in pending], max_distance,
+                        timeout=app.config['MATCHER_TIMEOUT'])
+    else:
+        found = trigram_closest([citations[i] for i in pending], max_distance)
+    for i, closest in zip(pending, found):
+        if closest is not None:
+            ret[i] = EXACT_MATCH if closest[0] == 0 else APPROX_MATCH
+    return ret
+
+
+def get_budget(tier=FUZZY_TIER):
+    """Returns seconds matching of current request may take, None if time budget of matching tier is not set"""
+    return app.config['MATCH_TIER_BUDGETS'].get(tier, app.config['MATCH_TIME_BUDGET'])
+
+
+def parse_tier(value):
+    """Parse matching tier posted by client, DEFAULT_MATCH_TIER if not given"""
+    if not value:
+        return app.config['DEFAULT_MATCH_TIER']
+    if value not in MATCH_TIERS:
+        abort(400, 'Unsupported matching tier: %s' % value)
+    return value
+
+
+def tier_distance(tier):
+    """Maximum edit distance of matching tier"""
+    return app.config['MAX_EDIT_DISTANCE'] if tier == FUZZY_TIER else 0
+
+
+def get_single_flight():
+    """Returns single-flight coalescing of identical checks, None if disabled"""
+    global _single_flight
+    if _single_flight is None and app.config['SINGLE_FLIGHT_PATH']:
+        try:
+            _single_flight = SingleFlight(app.config['SINGLE_FLIGHT_PATH'], ttl=app.config['SINGLE_FLIGHT_TTL'],
+                                          wait=app.config['SINGLE_FLIGHT_WAIT'])
+        except OSError as e:
+            app.logger.error('Single-flight coalescing disabled: %s', e)
+            app.config['SINGLE_FLIGHT_PATH'] = None
+    return _single_flight
+
+
+def get_admission():
+    """Returns admission control of checks, None if disabled"""
+    global _admission
+    if _admission is None and app.config['ADMISSION_PATH']:
+        try:
+            _admission = Admission(app.config['ADMISSION_PATH'], slots=app.config['CHECK_SLOTS'],
+                                   queue=app.config['CHECK_QUEUE'], wait=app.config['CHECK_QUEUE_WAIT'],
+                                   per_client=app.config['CLIENT_CHECKS'], retry_after=app.config['RETRY_AFTER'])
+        except OSError as e:
+            app.logger.error('Admission control disabled: %s', e)
+            app.config['ADMISSION_PATH'] = None
+    return _admission
+
+
+def admit(tier=FUZZY_TIER):
+    """
+    Admit a check of current request (see Admission). Only checks of
+    fuzzy tier take slots, cheaper tiers are always admitted.
+
+    :param tier:    matching tier of the check, default is FUZZY_TIER
+    :type tier:     str
+    :return:        slots held by request, to be released when it ends
+    :rtype:         Ticket
+    :raises:        Rejected if request is not admitted
+    """
+
+    admission = get_admission()
+    if admission is None or tier != FUZZY_TIER:
+        return Ticket([])
+    return admission.admit(request.remote_addr or '')
+
+
+def oversized():
+    """Returns True if body of current request is larger than MAX_CHECK_SIZE"""
+    limit = app.config['MAX_CHECK_SIZE']
+    return limit is not None and (request.content_length or 0) > limit
+
+
+def limit_size():
+    """
+    Reject request whose body is larger than MAX_CHECK_SIZE, before it is
+    parsed. Chunked bodies (without length) are rejected, as they would be
+    read whatever their size.
+    """
+    if request.content_length is None and request.environ.get('wsgi.input_terminated'):
+        raise Rejected(411, 'Length of posted text is required.')
+    if oversized():
+        raise Rejected(413, 'Your text is too long to be checked at once. Please check it in parts.')
+
+
+def limit_citations(count):
+    """Reject checking more than MAX_CHECK_CITATIONS citations at once"""
+    limit = app.config['MAX_CHECK_CITATIONS']
+    if limit is not None and count > limit:
+        raise Rejected(413, 'Too many citations to check at once (%d, at most %d). Please check them in parts.'
+                       % (count, limit))
+
+
+def check_citations(found, budget=None, tier=FUZZY_TIER):
+    """
+    Match list of parsed citations
+
+    :param found:       parsed citations
+    :type found:        list
+    :param budget:      seconds after which citations are not checked any more, counted once
+                        citations are loaded; the first citation is always checked
+    :type budget:       int or float or None
+    :param tier:        matching tier, one of MATCH_TIERS, default is FUZZY_TIER
+    :type tier:         str
+    :return:            list of (citation, EXACT_MATCH or APPROX_MATCH or UNCHECKED or None) pairs
+    :rtype:             list
+    """
+
+    # Look up DOIs of citations, then load all available citations used for matching
+    dois = lookup_dois(citation_dois(found))
+    max_distance = tier_distance(tier)
+
+    # Scatter citations to matcher shards, or select candidates in database
+    if tier != DOI_TIER and remote_matching():
+        return list(zip(found, match_remote(found, dois, max_distance)))
+
+    # Do matching for each citation found, until deadline. DOI tier needs no corpus.
+    corpus = get_corpus() if tier != DOI_TIER else None
+    candidates = corpus.candidates if corpus is not None else ()
+    exact = corpus.exact if corpus is not None else None
+    deadline = None if budget is None else time.monotonic() + budget
+    ret = []
+    try:
+        for citation in found:
+            # Each request checks at least one citation, so that continuing always progresses
+            if ret and deadline is not None and time.monotonic() > deadline:
+                raise MatchTimeout()
+            ret.append((citation, match(citation, dois, candidates, max_distance=max_distance,
+                                        exact=exact, deadline=deadline if ret else None, tier=tier)))
+    except MatchTimeout:
+        ret.extend((citation, UNCHECKED) for citation in found[len(ret):])
+    return ret
+
+
+def citation_hash(citation):
+    """Short hash identifying a parsed citation, used by clients to cache its result"""
+    return hashlib.sha1(citation.encode('utf-8')).hexdigest()[:16]
+
+
+def highlight(text, results):
+    """Highlight matched citations of results in text, escaped as HTML"""
+    text = str(escape(text))
+    for citation, matched in results:
+        if matched is not None:
+            citation = str(escape(citation))
+            text = text.replace(citation, MARKS[matched](citation))
+    return text
+
+
+def highlight_matches(text, budget=None, checked=(), tier=FUZZY_TIER):
     """
     Parse input text into a list of citations, highlight matched citations
 
-    :param text:    input text
-    :type text:     str
-    :return:        highlighted text (or original text if not found)
-    :rtype:         str
+    :param text:        input text
+    :type text:         str
+    :param budget:      seconds citations may be checked, once parsed (see check_citations())
+    :type budget:       int or float or None
+    :param checked:     results of first citations, checked by previous requests
+    :type checked:      list or tuple
+    :param tier:        matching tier, one of MATCH_TIERS, default is FUZZY_TIER
+    :type tier:         str
+    :return:            highlighted text escaped as HTML (or None if not found), and result of each citation
+    :rtype:             tuple
     """
 
     # Parse input text into list of citations
     found = parse_citations(text)
+    limit_citations(len(found))
 
     # Citations found
     if found:
 
-        # Load all available citations from local DB used for matching
-        articles = Article.query.all()
-        dois = set(doi_normalize(a.doi) for a in articles if a.doi)
-        citations = Citation.query.all()
-
-        # Do matching for each citation found
-        for citation in found:
-            matched = matching(citation, dois, citations, max_distance=app.config['MAX_EDIT_DISTANCE'])
-            if matched.endswith('</mark>'):
-                text = text.replace(citation, matched)
-
         # Return highlighted text which matched citations
-        return text
+        checked = list(checked[:len(found)])
+        results = list(zip(found, checked)) + check_citations(found[len(checked):], budget=budget,
+                                                                tier=tier)
+        return highlight(text, results), results
 
     # Return nothing if no citation found
-    return None
+    return None, []
 
 
-def handle_post(data, **kwargs):
+def highlight_shared(text, checked=(), tier=FUZZY_TIER):
+    """
+    Same as highlight_matches() within time budget of tier, but identical
+    concurrent checks (same text, results checked before, tier and corpus)
+    are computed once and shared. Only the request computing a check is
+    admitted (see admit()), identical requests waiting for it take no slot.
+    Partial results (time budget ran out) are not shared.
     """
-    Process posted citations as POST data
 
-    :param data:    posted citations as POST data
+    def compute():
+        with admit(tier):
+            return highlight_matches(text, budget=get_budget(tier), checked=checked, tier=tier)
+
+    flight = get_single_flight()
+    if flight is None:
+        return compute()
+
+    key = flight_key(corpus_generation(), tier_distance(tier), tier, json.dumps(checked), text)
+    wait = get_budget(tier)
+    highlights, results = flight.do(
+        key, compute, share=lambda ret: all(matched != UNCHECKED for _, matched in ret[1]), wait=wait
+    )
+    return highlights, [tuple(result) for result in results]
+
+
+def parse_checked(value):
+    """Parse results of citations checked before time budget ran out, posted to continue checking"""
+
+    try:
+        ret = json.loads(value) if value else []
+    except ValueError:
+        return []
+    if not isinstance(ret, list) or any(m not in (EXACT_MATCH, APPROX_MATCH, None) for m in ret):
+        return []
+    return ret
+
+
+def process_job(data):
+    """
+    Check citations of a queued job, used by job workers
+
+    :param data:    submitted text
     :type data:     str
-    :param kwargs:  arbitrary key-value pairs used for page rendering
-    :return:        rendered Index page with text highlighted
+    :return:        highlighted text escaped as HTML (None if no citation found) and match of each citation
+    :rtype:         dict
+    """
+
+    results = check_citations(parse_citations(data))
+    return {
+        'highlights': highlight(data, results) if results else None,
+        'citations': [{'citation': c, 'match': m} for c, m in results]
+    }
+
+
+def render_result(data, highlights, results=(), **kwargs):
+    """
+    Render highlighted citations
+
+    :param data:        posted citations
+    :type data:         str
+    :param highlights:  highlighted text escaped as HTML, or None if no citation found
+    :type highlights:   str or None
+    :param results:     result of each citation, to offer continuing unchecked ones
+    :type results:      list or tuple
+    :param kwargs:      arbitrary key-value pairs used for page rendering
+    :return:            rendered Index page with text highlighted
     """
 
-    # Find and highlight matches in data
-    highlights = highlight_matches(text=data)
+    unchecked = sum(1 for _, matched in results if matched == UNCHECKED)
 
     # No highlights or matches found
     if highlights is None:
         flash('No citations found. Likely reason: citations were not in the correct format.', 'failed')
-        highlights = data
+        highlights = str(escape(data))
+
+    # Time budget ran out
+    elif unchecked:
+        flash('Checking took too long, %d of %d citations were not checked yet.' % (unchecked, len(results)),
+              'failed')
+        kwargs['unchecked'] = unchecked
+        kwargs['checked'] = json.dumps([matched for _, matched in results[:len(results) - unchecked]])
 
     # Highlights found
     elif '</mark>' not in highlights:
@@ -72,6 +384,69 @@ def handle_post(data, **kwargs):
     return render_template('index.html', highlights=highlights, text=data, **kwargs)
 
 
+@profiled('post')
+def handle_post(data, checked=(), tier=FUZZY_TIER, **kwargs):
+    """
+    Process posted citations as POST data
+
+    :param data:    posted citations as POST data
+    :type data:     str
+    :param checked: results of first citations, checked by previous requests
+    :type checked:  list or tuple
+    :param tier:    matching tier, one of MATCH_TIERS, default is FUZZY_TIER
+    :type tier:     str
+    :param kwargs:  arbitrary key-value pairs used for page rendering
+    :return:        rendered Index page with text highlighted
+    """
+
+    # Queue large fuzzy checks for job workers
+    threshold = app.config['JOB_THRESHOLD']
+    if tier == FUZZY_TIER and threshold is not None and len(data) > threshold:
+        return redirect(url_for('job', job_id=get_job_queue().enqueue(data)))
+
+    # Find and highlight matches in data, within time budget of tier
+    highlights, results = highlight_shared(text=data, checked=checked, tier=tier)
+    return render_result(data, highlights, results=results, tier=tier, **kwargs)
+
+
+@app.errorhandler(ShardError)
+def shard_error(e):
+    """Renders Index page with an error if matcher shards are unavailable"""
+
+    app.logger.error('Matching failed: %s', e)
+    flash('Checking your citations failed. Please try again later.', 'failed')
+    kwargs = {
+        'title': app.config['INDEX_PAGE_TITLE'],
+        'header': app.config['INDEX_PAGE_HEADER']
+    }
+    return render_template('index.html', text=request.form.get('citations'), **kwargs), 503
+
+
+@app.errorhandler(Rejected)
+def rejected(e):
+    """
+    Renders Index page with an error if a check is rejected (see Admission),
+    returns the error as JSON to other endpoints
+    """
+
+    headers = {'Retry-After': str(e.retry_after)} if e.retry_after is not None else {}
+    if request.endpoint != 'index':
+        return jsonify(error=e.message), e.status, headers
+
+    if e.status in (411, 413):
+        flash(e.message, 'failed')
+    elif e.status == 429:
+        flash('You are already checking citations. Please wait for them before checking more.', 'failed')
+    else:
+        flash('The service is busy. Please try again in a moment.', 'failed')
+    kwargs = {
+        'title': app.config['INDEX_PAGE_TITLE'],
+        'header': app.config['INDEX_PAGE_HEADER']
+    }
+    text = None if e.status == 411 or oversized() else request.form.get('citations')
+    return render_template('index.html', text=text, **kwargs), e.status, headers
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     """Main index page of application. Accepts both GET and POST methods"""
@@ -83,12 +458,226 @@ def index():
 
     # Method is POST
     if request.method == 'POST':
+        limit_size()
         data = request.form.get('citations')
+        tier = parse_tier(request.form.get('tier'))
         if data:
-            return handle_post(data, **kwargs)
+            return handle_post(data, checked=parse_checked(request.form.get('checked')), tier=tier, **kwargs)
 
     # Method is GET or POST with empty data
-    return render_template('index.html', **kwargs)
+    return render_template('index.html', tier=app.config['DEFAULT_MATCH_TIER'], **kwargs)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue citations for checking by job workers. Citations are posted
+    as 'citations' form field or as raw request body. Returns job ID and
+    URL to poll for its status and result.
+    """
+
+    limit_size()
+    data = request.form.get('citations') or request.get_data(as_text=True)
+    if not data:
+        abort(400, 'No citations posted')
+
+    job_id = get_job_queue().enqueue(data)
+    url = url_for('job', job_id=job_id)
+    return jsonify(id=job_id, status=QUEUED, url=url), 202, {'Location': url}
+
+
+@app.route('/jobs/<job_id>')
+def job(job_id):
+    """
+    Status and result of a queued job. Returns JSON to API clients,
+    renders Index page with highlighted citations to browsers.
+    """
+
+    accepted = request.accept_mimetypes
+    if accepted.accept_json and not accepted.accept_html:
+        ret = get_job_queue().get(job_id)
+        if ret is None:
+            abort(404)
+        return jsonify(ret)
+
+    ret = get_job_queue().get(job_id, with_data=True)
+    if ret is None:
+        abort(404)
+
+    kwargs = {
+        'title': app.config['INDEX_PAGE_TITLE'],
+        'header': app.config['INDEX_PAGE_HEADER']
+    }
+
+    if ret['status'] == DONE:
+        return render_result(ret['data'], ret['result']['highlights'], **kwargs)
+
+    if ret['status'] in (QUEUED, RUNNING):
+        flash('Your citations are being checked. Refresh this page in a moment to see the result.')
+    else:
+        flash('Checking your citations failed. Please try again later.', 'failed')
+    return render_template('index.html', text=ret['data'], **kwargs)
+
+
+def result_fields(results, citation_id):
+    """Fields of a citation result returned by /recheck, none if known by client"""
+    if citation_id not in results:
+        return {}
+    if results[citation_id] == UNCHECKED:
+        return {'unchecked': True}
+    return {'match': results[citation_id]}
+
+
+@app.route('/recheck', methods=['POST'])
+def recheck():
+    """
+    Match citations of changed paragraphs only, for live highlighting while
+    typing. Posted as JSON object with 'paragraphs' (list of texts) and
+    'known' (list of hashes of citations whose results the client already
+    has), and optionally 'tier' (matching tier). Returns citations of each
+    paragraph with their hashes; matches are returned only for citations
+    not known by the client. Citations not checked within the time budget
+    of the tier are flagged as unchecked.
+    """
+
+    limit_size()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('paragraphs'), list):
+        abort(400, 'Paragraphs must be posted as JSON list')
+    known = data.get('known') or []
+    if not isinstance(known, list) or not all(isinstance(h, str) for h in known):
+        abort(400, 'Known citations must be posted as JSON list of hashes')
+    known = set(known)
+    tier = parse_tier(data.get('tier'))
+
+    # Parse paragraphs, match each new citation once
+    paragraphs = [[(citation_hash(c), c) for c in parse_citations(str(p))] for p in data['paragraphs']]
+    pending = OrderedDict((h, c) for found in paragraphs for h, c in found if h not in known)
+    limit_citations(len(pending))
+    results = {}
+    if pending:
+        with admit(tier):
+            checked = check_citations(list(pending.values()), budget=get_budget(tier), tier=tier)
+        results = dict(zip(pending, (matched for _, matched in checked)))
+
+    return jsonify(paragraphs=[
+        [dict(hash=h, citation=c, **result_fields(results, h)) for h, c in found]
+        for found in paragraphs
+    ])
+
+
+@app.route('/upload', methods=['POST'])
+def upload():
+    """
+    Match references of a bibliography file posted as raw request body
+    (not as a form). The body is read and matched reference by reference,
+    results are streamed back as JSON lines, followed by a summary line.
+    Bodies larger than UPLOAD_MAX_SIZE or not checked within
+    UPLOAD_TIME_LIMIT are cut, with an error line before the summary.
+
+    Query arguments:
+        format: bibliography format (txt, ris or bib), guessed if missing
+        tier: matching tier (doi, exact or fuzzy), DEFAULT_MATCH_TIER if missing
+    """
+
+    fmt = request.args.get('format')
+    if fmt is not None and fmt not in FORMATS:
+        abort(400, 'Unsupported format: %s' % fmt)
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        abort(415, 'Bibliography must be posted as raw request body')
+    tier = parse_tier(request.args.get('tier'))
+    max_size = app.config['UPLOAD_MAX_SIZE']
+    if max_size is not None and (request.content_length or 0) > max_size:
+        raise Rejected(413, 'Bibliography is larger than %d bytes' % max_size)
+
+    corpus = None if tier == DOI_TIER or remote_matching() else get_corpus()
+    max_distance = tier_distance(tier)
+
+    # Slots are held until the response is streamed, within time limit
+    ticket = admit(tier)
+    time_limit = app.config['UPLOAD_TIME_LIMIT']
+    lines = iter_lines(request.stream, chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+                       max_size=app.config['UPLOAD_MAX_ENTRY_SIZE'], max_total=max_size,
+                       deadline=None if time_limit is None else time.monotonic() + time_limit)
+
+    def generate():
+        with ticket:
+            total = matches = 0
+            try:
+                for ref in read_references(lines, fmt=fmt, max_size=app.config['UPLOAD_MAX_ENTRY_SIZE']):
+                    dois = lookup_dois([ref.doi] + citation_dois([ref.citation]))
+                    if ref.doi and doi_normalize(ref.doi) in dois:
+                        matched = EXACT_MATCH
+                    elif tier == DOI_TIER:
+                        matched = EXACT_MATCH if doi_matched(ref.citation, dois) else None
+                    elif corpus is None:
+                        matched = match_remote([ref.citation], dois, max_distance)[0]
+                    else:
+                        matched = match(ref.citation, dois, corpus.candidates, max_distance=max_distance,
+                                        exact=corpus.exact, tier=tier)
+                    total += 1
+                    matches += matched is not None
+                    yield json.dumps({'citation': ref.citation, 'doi': ref.doi, 'match': matched}) + '\n'
+            except InputLimit as e:
+                yield json.dumps({'error': str(e)}) + '\n'
+            yield json.dumps({'citations': total, 'matches': matches}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    """
+    Serves fingerprinted assets built by build_static.py, using their
+    precompressed variants if accepted by client, with far-future caching.
+    """
+
+    for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(ASSETS_DIR, filename + ext)):
+            response = send_from_directory(ASSETS_DIR, filename + ext,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(ASSETS_DIR, filename)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['ASSETS_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness of web process"""
+    return jsonify(status='ok')
+
+
+@app.route('/healthz/ready')
+def ready():
+    """
+    Readiness of web process, for load balancers: ready once its corpus is
+    loaded and its generation is known (see PRELOAD_CORPUS), or at once if
+    citations are matched outside web processes. A corpus not preloaded
+    (e.g. database was down when starting) is loaded by this request.
+    Returns 503 if not ready.
+    """
+
+    if remote_matching():
+        return jsonify(ready=True, matching='remote')
+
+    corpus = loaded_corpus()
+    if corpus is None:
+        try:
+            corpus = get_corpus()
+        except SQLAlchemyError as e:
+            app.logger.error('Corpus not loaded: %s', e)
+            return jsonify(ready=False), 503
+    if not corpus.generation:
+        return jsonify(ready=False), 503
+    return jsonify(ready=True, generation=corpus.generation, citations=len(corpus))
 
 
 @app.route('/about')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Benchmark the BK-tree index of app.bktree against the edit distance scan.
+
+The script builds a BK-tree over sample citations, then queries it with
+corpus citations altered by a few random edits (and with unrelated ones).
+It checks that the tree finds exactly the citations the scan finds within
+the radius, and reports the number of nodes visited per query (the
+distance computations left after pruning) and the time of both methods.
+
+Usage (from the project folder):
+    python -m benchmarks.bktree [--citations N] [--queries N] [--radius N]
+"""
+
+import sys
+import time
+import random
+from argparse import ArgumentParser
+from collections import namedtuple
+from Levenshtein import distance
+from app.bktree import BKTree
+from app.utils import normalize_all
+from .normalize import gen_citation
+
+Entry = namedtuple('Entry', 'id normalized')
+
+
+def alter(rng, text, edits):
+    """Apply random character edits to text"""
+
+    for _ in range(edits):
+        i = rng.randrange(len(text))
+        op = rng.randrange(3)
+        c = rng.choice('abcdefghijklmnopqrstuvwxyz .,')
+        text = text[:i] + c + text[i + 1:] if op == 0 else text[:i] + c + text[i:] if op == 1 else text[:i] + text[i + 1:]
+    return text
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Benchmark BK-tree index')
+    parser.add_argument('--citations', type=int, default=20000, help='number of sample citations')
+    parser.add_argument('--queries', type=int, default=100, help='number of queries')
+    parser.add_argument('--radius', type=int, default=3, help='maximum edit distance (MAX_EDIT_DISTANCE)')
+    return parser.parse_args(*params)
+
+
+def main():
+    """Main benchmark program"""
+
+    args = get_args()
+    rng = random.Random(0)
+    texts = normalize_all(gen_citation(rng, 1) for _ in range(args.citations))
+    entries = [Entry(i, t) for i, t in enumerate(texts)]
+
+    start = time.perf_counter()
+    tree = BKTree(entries)
+    print('Built tree of %d citations in %.2f s' % (len(tree), time.perf_counter() - start))
+
+    # Half of queries are altered corpus citations, half are not in corpus
+    queries = [alter(rng, rng.choice(texts), rng.randint(0, args.radius + 1)) for _ in range(args.queries // 2)]
+    queries += normalize_all(gen_citation(rng, 1) for _ in range(args.queries - len(queries)))
+
+    start = time.perf_counter()
+    found = [tree.search(q, args.radius) for q in queries]
+    tree_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [{e.id for e in entries if distance(q, e.normalized) <= args.radius} for q in queries]
+    scan_time = time.perf_counter() - start
+
+    if [{e.id for _, e in matches} for matches, _ in found] != expected:
+        print('Mismatch between BK-tree and scan results')
+        sys.exit(1)
+    print('Same results as scan for %d queries within %d edits (%d matched).' % (
+        len(queries), args.radius, sum(1 for e in expected if e)
+    ))
+
+    visits = sorted(v for _, v in found)
+    print('Visited nodes per query: mean %.0f (%.1f%% of corpus), median %d, max %d' % (
+        tree.visits / tree.queries, 100.0 * tree.visits / tree.queries / len(tree),
+        visits[len(visits) // 2], visits[-1]
+    ))
+    print('%-6s %8.2f ms/query' % ('scan', scan_time * 1000 / len(queries)))
+    print('%-6s %8.2f ms/query  x%.2f' % ('bktree', tree_time * 1000 / len(queries), scan_time / tree_time))
+
+
+if __name__ == '__main__':
+    main()
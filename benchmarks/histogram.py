@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Benchmark the character histogram filter of app.histogram against the
+edit distance scan (needs NumPy).
+
+The script queries sample citations with corpus citations altered by a
+few random edits (and with unrelated ones). It checks that the filter
+never rejects a citation within the maximum edit distance, and reports
+the share of citations it rejects and the time of both methods.
+
+Usage (from the project folder):
+    python -m benchmarks.histogram [--citations N] [--queries N] [--radius N]
+"""
+
+import sys
+import time
+import random
+from argparse import ArgumentParser
+from collections import namedtuple
+from Levenshtein import distance
+from app.histogram import HistogramFilter, np
+from app.utils import normalize_all
+from .bktree import alter
+from .normalize import gen_citation
+
+Entry = namedtuple('Entry', 'id normalized')
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Benchmark character histogram filter')
+    parser.add_argument('--citations', type=int, default=20000, help='number of sample citations')
+    parser.add_argument('--queries', type=int, default=100, help='number of queries')
+    parser.add_argument('--radius', type=int, default=3, help='maximum edit distance (MAX_EDIT_DISTANCE)')
+    return parser.parse_args(*params)
+
+
+def main():
+    """Main benchmark program"""
+
+    args = get_args()
+    if np is None:
+        print('NumPy is not installed')
+        sys.exit(1)
+
+    rng = random.Random(0)
+    texts = normalize_all(gen_citation(rng, 0.9) for _ in range(args.citations))
+    entries = [Entry(i, t) for i, t in enumerate(texts)]
+
+    start = time.perf_counter()
+    histograms = HistogramFilter(entries)
+    print('Built histograms of %d citations in %.2f s' % (len(histograms), time.perf_counter() - start))
+
+    # Half of queries are altered corpus citations, half are not in corpus
+    queries = [alter(rng, rng.choice(texts), rng.randint(0, args.radius + 1)) for _ in range(args.queries // 2)]
+    queries += normalize_all(gen_citation(rng, 0.9) for _ in range(args.queries - len(queries)))
+
+    start = time.perf_counter()
+    found = [{e.id for e in histograms.candidates(q, args.radius) if distance(q, e.normalized) <= args.radius}
+             for q in queries]
+    filter_time = time.perf_counter() - start
+    kept = sum(len(histograms.candidates(q, args.radius)) for q in queries)
+
+    start = time.perf_counter()
+    expected = [{e.id for e in entries if distance(q, e.normalized) <= args.radius} for q in queries]
+    scan_time = time.perf_counter() - start
+
+    if found != expected:
+        print('Filter rejected citations within %d edits' % args.radius)
+        sys.exit(1)
+    print('Same results as scan for %d queries within %d edits (%d matched).' % (
+        len(queries), args.radius, sum(1 for e in expected if e)
+    ))
+    print('Rejected by filter: %.3f%% of citations' % (100.0 - 100.0 * kept / len(queries) / len(entries)))
+    print('%-7s %8.2f ms/query' % ('scan', scan_time * 1000 / len(queries)))
+    print('%-7s %8.2f ms/query  x%.2f' % ('filter', filter_time * 1000 / len(queries), scan_time / filter_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+End-to-end load test of the application.
+
+The script seeds a stand-in database (a temporary SQLite file by default, or a
+local PostgreSQL database) with synthetic retracted articles, starts the
+application as a pre-forked server on the loopback interface, either with uWSGI
+(as deployed with wsgi.ini) or with a pre-forking werkzeug server, and replays
+a mix of page views and citation checks from concurrent clients. It reports
+throughput, latency percentiles and memory (RSS) of each server worker.
+
+No network access is needed: journal abbreviations are not looked up while
+seeding, and all requests go to 127.0.0.1.
+
+Usage (from the project folder):
+    python -m benchmarks.loadtest [--processes 5] [--clients 10] [--duration 30] [--coalesce] ...
+
+WARNING: the database given by --driver/--dbname is reset.
+"""
+
+import os
+import sys
+import time
+import json
+import random
+import logging
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from collections import defaultdict
+from argparse import ArgumentParser, SUPPRESS
+
+APP_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parts of generated articles
+SURNAMES = ['Smith', 'Nguyen', 'Muller', 'Garcia', 'Obrien', 'Schon', 'Lee', 'Tran', 'Cor', 'Sood', 'Kim', 'Patel']
+WORDS = ['effects', 'of', 'stress', 'on', 'cell', 'growth', 'in', 'vitro', 'mice', 'analysis', 'novel', 'protein',
+         'expression', 'cancer', 'patients', 'randomized', 'trial', 'treatment', 'outcomes', 'study', 'data']
+JOURNALS = ['Journal of Cell Biology', 'Cancer Research', 'Plos One', 'Nature Medicine', 'Science', 'The Lancet']
+
+# Pages requested by GET requests
+PAGES = ['/', '/about', '/how_to', '/contact']
+
+
+class OfflineWOS:
+    """Journal abbreviations are not looked up while seeding (no network)."""
+
+    def abbreviate(self, journal_title):
+        return None
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Load test the application end-to-end')
+    parser.add_argument('--server', choices=('auto', 'uwsgi', 'werkzeug'), default='auto',
+                        help='server running the application, default is uwsgi if installed')
+    parser.add_argument('--processes', type=int, default=5, help='number of server workers, default is 5')
+    parser.add_argument('--clients', type=int, default=10, help='number of concurrent clients, default is 10')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load, default is 30')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of warm-up load not being measured')
+    parser.add_argument('--articles', type=int, default=5000, help='number of seeded articles, default is 5000')
+    parser.add_argument('--get-ratio', type=float, default=0.5, help='ratio of GET page requests, default is 0.5')
+    parser.add_argument('--sizes', default='5,20,100',
+                        help='comma separated numbers of citations of posted bibliographies')
+    parser.add_argument('--match-rate', type=float, default=0.1,
+                        help='ratio of posted citations to retracted articles, default is 0.1')
+    parser.add_argument('--typo-rate', type=float, default=0.5,
+                        help='ratio of matching citations posted with typos, default is 0.5')
+    parser.add_argument('--driver', default='sqlite', help='database driver, default is sqlite')
+    parser.add_argument('--dbname', help='database name (file path for sqlite), default is a temporary file')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='coalesce identical concurrent checks (SINGLE_FLIGHT_PATH), disabled by default as '
+                             'bibliographies are replayed, so that checks are measured instead of shared results')
+    parser.add_argument('--config', action='append', default=[], metavar='KEY=VALUE',
+                        help='app config override (python literal value), can be repeated')
+    parser.add_argument('--json', dest='json_file', help='also write report to JSON file')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--serve', type=int, metavar='FD', help=SUPPRESS)
+
+    args = parser.parse_args(*params)
+    args.sizes = [int(i) for i in args.sizes.split(',') if i.strip()]
+    if not args.sizes or min(args.sizes) < 1:
+        parser.error('Sizes must be positive numbers')
+    return args
+
+
+def write_config(path, args):
+    """
+    Write app config file used by server and seeding (see RECITE_CONFIG).
+    Files of the app are written in the folder of the config file.
+    """
+
+    folder = os.path.dirname(path)
+    with open(path, 'w') as fp:
+        fp.write('DB_SETTINGS = %r\n' % {'driver': args.driver, 'dbname': args.dbname})
+        fp.write('JOB_QUEUE_PATH = %r\n' % os.path.join(folder, 'jobs.sqlite'))
+        fp.write('SINGLE_FLIGHT_PATH = %r\n' % (os.path.join(folder, 'flight') if args.coalesce else None))
+        fp.write('ADMISSION_PATH = %r\n' % os.path.join(folder, 'admission'))
+        # All clients share the loopback address
+        fp.write('CLIENT_CHECKS = None\n')
+        fp.write('BKTREE_PATH = %r\n' % os.path.join(folder, 'bktrees'))
+        for item in args.config:
+            key, _, value = item.partition('=')
+            fp.write('%s = %s\n' % (key.strip(), value.strip()))
+
+
+def gen_article(rng, index):
+    """Generates fields of a synthetic article, like rows of freshdb.py."""
+
+    authors = '; '.join('%s, %s' % (rng.choice(SURNAMES), ''.join(rng.choice('ABCDEFGH') for _ in range(2)))
+                        for _ in range(rng.randint(1, 9)))
+    year = str(rng.randint(1980, 2018))
+    conference = rng.random() < 0.1
+    return dict(
+        author=authors, author_full_name=authors, group_author='',
+        article_title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))).capitalize(),
+        pub_name=rng.choice(JOURNALS), pub_date=year, pub_year=year,
+        volume=str(rng.randint(1, 200)), issue=str(rng.randint(1, 12)), special_issue='',
+        begin_page=str(rng.randint(1, 900)), end_page=str(rng.randint(901, 999)),
+        conf_title='International Conference on %s' % rng.choice(WORDS).title() if conference else '',
+        conf_date='JUN %s' % year if conference else '', conf_location='Paris' if conference else '',
+        article_number='', index=index, doi='10.%d/%d' % (rng.randint(1000, 9999), index) if rng.random() < 0.5 else ''
+    )
+
+
+def seed(args, rng):
+    """
+    Reset the database and seed it with synthetic articles
+
+    :return:    list of generated citations (for posting matches)
+    :rtype:     list
+    """
+
+    import styles.ama
+    styles.ama.WOS = OfflineWOS
+
+    import freshdb
+    from app import app, db
+    from app.models import Article, Citation, citation_articles
+
+    print('Seeding %d articles into %s database %s...' % (args.articles, args.driver, args.dbname))
+    freshdb.db_init_or_reset()
+    db.session.bulk_save_objects([Article(**gen_article(rng, i)) for i in range(args.articles)])
+    db.session.commit()
+
+    citations = []
+    for article in Article.query.all():
+        fields = {k: v for k, v in article.__dict__.items() if not k.startswith('_')}
+        citations.extend(freshdb.gen_citations(variants=app.config['CITATION_VARIANTS'], **fields))
+    ret = [c.value for c in citations if not c.variant]
+
+    # Store citations as freshdb.py does
+    citations, links = freshdb.dedup_citations(sorted(citations, key=lambda c: c.variant is not None))
+    db.session.bulk_save_objects(citations)
+    db.session.execute(citation_articles.insert(), [{'citation_id': c, 'article_id': a} for c, a in links])
+    db.session.commit()
+    freshdb.store_generation(citations, links)
+    freshdb.reset_sequence(Citation.__table__, len(citations) + 1)
+    db.session.close()
+    db.engine.dispose()
+
+    print('Seeded %d citations.' % len(citations))
+    return ret
+
+
+def add_typos(rng, text, count):
+    """Apply random character edits to text"""
+
+    text = list(text)
+    for _ in range(count):
+        i = rng.randrange(len(text))
+        op = rng.choice('sid')
+        if op == 's':
+            text[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif op == 'i':
+            text.insert(i, rng.choice('abcdefghijklmnopqrstuvwxyz'))
+        elif len(text) > 1:
+            del text[i]
+    return ''.join(text)
+
+
+def gen_bibliography(rng, args, citations, size):
+    """Generates a bibliography of citations, some of them to retracted articles."""
+
+    from styles import APA
+    lines = []
+    for _ in range(size):
+        if rng.random() < args.match_rate:
+            citation = rng.choice(citations)
+            if rng.random() < args.typo_rate:
+                citation = add_typos(rng, citation, rng.randint(1, 2))
+        else:
+            citation = APA(**gen_article(rng, 0)).journal
+        lines.append(citation)
+    return '\n'.join(lines)
+
+
+def serve(fd, processes):
+    """Pre-forking werkzeug server, workers accept connections on a shared socket."""
+
+    from werkzeug.serving import make_server
+    from run import application
+
+    workers = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            server = make_server('127.0.0.1', 0, application, fd=fd)
+            server.serve_forever()
+            os._exit(0)
+        workers.append(pid)
+
+    def stop(*_):
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    for pid in workers:
+        os.waitpid(pid, 0)
+
+
+def start_server(args, env):
+    """
+    Start server listening on a free loopback port
+
+    :return:    tuple of (server process, port)
+    :rtype:     tuple
+    """
+
+    server = args.server
+    if server == 'auto':
+        server = 'uwsgi' if shutil.which('uwsgi') else 'werkzeug'
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+
+    if server == 'uwsgi':
+        sock.close()
+        cmd = ['uwsgi', '--http-socket', '127.0.0.1:%d' % port, '--module', 'run', '--master',
+               '--processes', str(args.processes), '--need-app', '--disable-logging', '--die-on-term']
+        proc = subprocess.Popen(cmd, cwd=APP_PATH, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    else:
+        sock.listen(128)
+        cmd = [sys.executable, '-m', 'benchmarks.loadtest', '--serve', str(sock.fileno()),
+               '--processes', str(args.processes)]
+        proc = subprocess.Popen(cmd, cwd=APP_PATH, env=env, pass_fds=(sock.fileno(),))
+        sock.close()
+
+    print('Started %s server with %d workers on port %d.' % (server, args.processes, port))
+    return proc, port
+
+
+def wait_ready(port, timeout=30):
+    """Wait until server responds"""
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/about')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(.2)
+    raise RuntimeError('Server did not start in %d seconds' % timeout)
+
+
+def worker_pids(pid):
+    """Returns PIDs of all descendants of a process (Linux only)"""
+
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open('/proc/%s/stat' % entry) as fp:
+                    ppid = int(fp.read().rsplit(')', 1)[1].split()[1])
+            except (IOError, IndexError, ValueError):
+                continue
+            children[ppid].append(int(entry))
+
+    ret = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            ret.append(child)
+            stack.append(child)
+    return sorted(ret)
+
+
+def memory(pid):
+    """Returns current and peak RSS of a process in MB"""
+
+    ret = {}
+    try:
+        with open('/proc/%d/status' % pid) as fp:
+            for line in fp:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    ret[key] = int(value.split()[0]) / 1024
+    except IOError:
+        pass
+    return ret.get('VmRSS'), ret.get('VmHWM')
+
+
+def client(port, args, rng, bibliographies, until, warmup_until, results):
+    """Sends requests until deadline, records (kind, status, latency) of measured requests"""
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    while time.time() < until:
+        if rng.random() < args.get_ratio:
+            kind = 'GET'
+            method, path, body, headers = 'GET', rng.choice(PAGES), None, {}
+        else:
+            size = rng.choice(args.sizes)
+            kind = 'POST %d' % size
+            body = urlencode({'citations': rng.choice(bibliographies[size])})
+            method, path, headers = 'POST', '/', {'Content-Type': 'application/x-www-form-urlencoded'}
+
+        start = time.time()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            status = None
+        latency = time.time() - start
+
+        if start >= warmup_until:
+            results.append((kind, status, latency))
+    conn.close()
+
+
+def percentile(values, p):
+    """Returns p-th percentile of sorted values"""
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def report(results, duration, workers, coalesce):
+    """Print and return report of results"""
+
+    print('Identical concurrent checks were %s.\n' % ('coalesced' if coalesce else 'not coalesced'))
+    groups = defaultdict(list)
+    for kind, status, latency in results:
+        groups[kind].append((status, latency))
+        groups['all'].append((status, latency))
+
+    ret = {'duration': duration, 'coalesce': coalesce, 'kinds': {}, 'workers': {}}
+    print('%-10s %9s %7s %9s %9s %9s %9s' % ('kind', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for kind in sorted(groups, key=lambda k: (k == 'all', k != 'GET', int(k.split()[-1]) if k[-1].isdigit() else 0)):
+        latencies = sorted(l for _, l in groups[kind])
+        errors = sum(1 for s, _ in groups[kind] if s is None or s >= 400)
+        row = {
+            'requests': len(latencies), 'errors': errors, 'throughput': len(latencies) / duration,
+            'p50': percentile(latencies, 50) * 1000, 'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000
+        }
+        ret['kinds'][kind] = row
+        print('%-10s %9d %7d %9.1f %9.1f %9.1f %9.1f' % (
+            kind, row['requests'], row['errors'], row['throughput'], row['p50'], row['p95'], row['p99']
+        ))
+
+    print('\n%-10s %12s %12s' % ('worker', 'RSS MB', 'peak RSS MB'))
+    for pid in workers:
+        rss, peak = memory(pid)
+        ret['workers'][pid] = {'rss': rss, 'peak_rss': peak}
+        print('%-10d %12.1f %12.1f' % (pid, rss or 0, peak or 0))
+    return ret
+
+
+def main():
+    """Main load test program"""
+
+    args = get_args()
+
+    # Internal mode: run pre-forking werkzeug server on inherited socket
+    if args.serve is not None:
+        serve(args.serve, args.processes)
+        return
+
+    rng = random.Random(args.seed)
+    tmpdir = tempfile.mkdtemp(prefix='recite-loadtest-')
+    if args.dbname is None:
+        if args.driver != 'sqlite':
+            sys.exit('--dbname is required for driver %s' % args.driver)
+        args.dbname = os.path.join(tmpdir, 'recite.db')
+
+    # Configure app for both seeding (this process) and server
+    config_file = os.path.join(tmpdir, 'config.py')
+    write_config(config_file, args)
+    os.environ['RECITE_CONFIG'] = config_file
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_PATH, os.environ.get('PYTHONPATH')])))
+
+    proc = None
+    try:
+        citations = seed(args, rng)
+        bibliographies = {
+            size: [gen_bibliography(rng, args, citations, size) for _ in range(20)] for size in args.sizes
+        }
+
+        proc, port = start_server(args, env)
+        wait_ready(port)
+
+        print('Running %d clients for %.0fs (+%.0fs warm-up)...' % (args.clients, args.duration, args.warmup))
+        results = []
+        warmup_until = time.time() + args.warmup
+        until = warmup_until + args.duration
+        threads = [
+            threading.Thread(target=client, args=(
+                port, args, random.Random(args.seed + i + 1), bibliographies, until, warmup_until, results
+            )) for i in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print()
+        ret = report(results, args.duration, worker_pids(proc.pid), args.coalesce)
+        if args.json_file:
+            with open(args.json_file, 'w') as fp:
+                json.dump(ret, fp, indent=2)
+
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Benchmark text normalization of app.utils against its previous implementation.
+
+The script first checks that both implementations return the same text for
+every normalization config over a sample of citations (ascii, unicode and
+irregular spaces), then times them on the same sample, one text at a time
+and in batch.
+
+It also times the edit distance scan of ld_matched for a few queries, where
+the previous code normalized every corpus citation for every query, and the
+corpus now holds citations normalized once when it is loaded.
+
+Usage (from the project folder):
+    python -m benchmarks.normalize [--citations N] [--repeat N] [--queries N]
+"""
+
+import sys
+import random
+import timeit
+import unicodedata
+from itertools import product
+from argparse import ArgumentParser
+from Levenshtein import distance
+from app.utils import normalize, normalize_all
+
+# Parts of generated citations
+SURNAMES = ['Smith', 'Nguyen', 'M\u00fcller', 'Garc\u00eda', 'O\'Brien', 'Sch\u00f6n', 'Lee', 'Dvo\u0159\u00e1k']
+WORDS = ['effects', 'of', 'Stress', 'on', 'cell', 'Growth', 'in', 'vitro', '\u03b2-cells', 'caf\u00e9', 'analysis']
+SPACES = [' ', ' ', ' ', '  ', '\t', '\n', '\u00a0', '\u2009']
+
+
+def reference_normalize(text, case=True, spaces=True, unicode=True):
+    """Previous implementation of app.utils.normalize"""
+
+    if unicode:
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    if case:
+        text = text.lower()
+    if spaces:
+        text = ' '.join(text.split())
+    return text
+
+
+def gen_citation(rng, ascii_ratio):
+    """Generates a random APA-like citation"""
+
+    ascii_only = rng.random() < ascii_ratio
+    pick = (lambda items: unicodedata.normalize('NFKD', rng.choice(items)).encode('ascii', 'ignore').decode()) \
+        if ascii_only else rng.choice
+    space = (lambda: ' ') if ascii_only else (lambda: rng.choice(SPACES))
+    authors = ', '.join('%s, %s.' % (pick(SURNAMES), rng.choice('ABCDEFGH')) for _ in range(rng.randint(1, 4)))
+    title = space().join(pick(WORDS) for _ in range(rng.randint(5, 12)))
+    return '%s (%d).%s%s. Journal Of %s, %d(%d), %d-%d.' % (
+        authors, rng.randint(1950, 2018), space(), title.capitalize(), pick(WORDS).title(),
+        rng.randint(1, 99), rng.randint(1, 12), rng.randint(1, 500), rng.randint(501, 999)
+    )
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Benchmark text normalization')
+    parser.add_argument('--citations', type=int, default=10000, help='number of sample citations')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timing runs, best is reported')
+    parser.add_argument('--queries', type=int, default=10, help='number of queries of the scan benchmark')
+    parser.add_argument('--ascii-ratio', type=float, default=0.9, help='ratio of ascii-only citations')
+    return parser.parse_args(*params)
+
+
+def main():
+    """Main benchmark program"""
+
+    args = get_args()
+    rng = random.Random(0)
+    texts = [gen_citation(rng, args.ascii_ratio) for _ in range(args.citations)]
+
+    # Check equivalence
+    for config in product((True, False), repeat=3):
+        expected = [reference_normalize(t, *config) for t in texts]
+        if [normalize(t, *config) for t in texts] != expected or normalize_all(texts, *config) != expected:
+            print('Mismatch for config case=%s spaces=%s unicode=%s' % config)
+            sys.exit(1)
+    print('Equivalent on %d citations for all 8 configs.' % len(texts))
+
+    # Time implementations
+    runs = [
+        ('previous', lambda: [reference_normalize(t) for t in texts]),
+        ('normalize', lambda: [normalize(t) for t in texts]),
+        ('normalize_all', lambda: normalize_all(texts))
+    ]
+    best = {}
+    for name, func in runs:
+        best[name] = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-14s %8.2f ms  %6.2f us/citation  x%.2f' % (
+            name, best[name] * 1000, best[name] * 1e6 / len(texts), best['previous'] / best[name]
+        ))
+
+    # Time edit distance scan
+    queries = texts[:args.queries]
+    normalized = normalize_all(texts)
+    runs = [
+        ('previous scan', lambda: [
+            min(distance(reference_normalize(q), reference_normalize(t)) for t in texts) for q in queries
+        ]),
+        ('scan', lambda: [
+            min(distance(n, t) for t in normalized) for n in normalize_all(queries)
+        ])
+    ]
+    best = {}
+    for name, func in runs:
+        best[name] = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-14s %8.2f ms  %6.2f ms/query     x%.2f' % (
+            name, best[name] * 1000, best[name] * 1000 / len(queries), best['previous scan'] / best[name]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Check the 'trigram' index of app.trigram against the edit distance scan,
+on the configured PostgreSQL database (filled by freshdb.py, see
+RECITE_CONFIG to point to a local test instance).
+
+The script queries the database with stored citations altered by a few
+random edits (and with unrelated ones), then checks that the closest
+edit distance found through pg_trgm candidates is the one found by
+scanning the in-memory corpus, and reports the time of both methods.
+
+Usage (from the project folder):
+    python -m benchmarks.trigram [--queries N] [--batch N]
+"""
+
+import sys
+import time
+import random
+from argparse import ArgumentParser
+from app import app, db
+from app.corpus import load_corpus, corpus_generation
+from app.trigram import trigram_closest
+from .bktree import alter
+from .normalize import gen_citation
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Check and time trigram index')
+    parser.add_argument('--queries', type=int, default=200, help='number of queries')
+    parser.add_argument('--batch', type=int, default=50, help='number of queries per submission')
+    return parser.parse_args(*params)
+
+
+def main():
+    """Main benchmark program"""
+
+    args = get_args()
+    rng = random.Random(0)
+    max_distance = app.config['MAX_EDIT_DISTANCE']
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print('Trigram index needs PostgreSQL, database is %s' % db.engine.dialect.name)
+            sys.exit(1)
+
+        corpus = load_corpus(corpus_generation())
+        if not len(corpus):
+            print('No citation in database, run freshdb.py first')
+            sys.exit(1)
+
+        # Half of queries are altered stored citations, half are not in database
+        queries = [alter(rng, rng.choice(corpus.entries).normalized, rng.randint(0, max_distance + 1))
+                   for _ in range(args.queries // 2)]
+        queries += [gen_citation(rng, 1) for _ in range(args.queries - len(queries))]
+
+        start = time.perf_counter()
+        found = []
+        for i in range(0, len(queries), args.batch):
+            found.extend(trigram_closest(queries[i:i + args.batch], max_distance))
+        trigram_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [corpus.closest(q, max_distance) for q in queries]
+        scan_time = time.perf_counter() - start
+
+    missed = sum(1 for f, e in zip(found, expected) if (f and f[0]) != (e and e[0]))
+    print('%d of %d queries matched by scan within %d edits, %d differ with trigram index.' % (
+        sum(1 for e in expected if e), len(queries), max_distance, missed
+    ))
+    print('%-8s %8.2f ms/query' % ('scan', scan_time * 1000 / len(queries)))
+    print('%-8s %8.2f ms/query  x%.2f' % ('trigram', trigram_time * 1000 / len(queries), scan_time / trigram_time))
+    if missed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Build fingerprinted and precompressed static assets.
+
+Every file in the static folder is copied into the assets folder (app/static/dist)
+with a hash of its content in the file name, so that it can be cached by browsers
+forever. Text assets also get precompressed gzip (.gz) and, if the brotli library
+is installed, brotli (.br) variants. A manifest maps static file names to their
+fingerprinted names, which is used by the asset_url() template helper.
+
+Run this script again whenever a static file changes, then reload the application.
+
+For more information, try:
+    ./build_static.py --help
+"""
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+from argparse import ArgumentParser
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+APP_PATH = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_PATH, 'app', 'static')
+ASSETS_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(ASSETS_DIR, 'manifest.json')
+
+# Length of content hash in file names
+HASH_LENGTH = 12
+
+# Extensions of files being precompressed
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt')
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Build fingerprinted and precompressed static assets')
+    parser.add_argument('--no-compress', dest='compress', action='store_false',
+                        help='do not create precompressed variants')
+    return parser.parse_args(*params)
+
+
+def list_static_files():
+    """Returns paths of all static files (relative to static folder), except built assets."""
+
+    ret = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if os.path.abspath(root) == STATIC_DIR:
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != ASSETS_DIR]
+        for name in files:
+            ret.append(os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/'))
+    return sorted(ret)
+
+
+def fingerprint(path, data):
+    """
+    Generates fingerprinted file name using hash of file content
+
+    :param path:    file path
+    :type path:     str
+    :param data:    file content
+    :type data:     bytes
+    :return:        path with content hash inserted before extension
+    :rtype:         str
+    """
+
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(path)
+    return '%s.%s%s' % (base, digest, ext)
+
+
+def write_asset(path, data, compress):
+    """
+    Write asset and its precompressed variants into assets folder
+
+    :param path:        fingerprinted path of asset
+    :type path:         str
+    :param data:        asset content
+    :type data:         bytes
+    :param compress:    create precompressed variants
+    :type compress:     bool
+    :return:            number of files written
+    :rtype:             int
+    """
+
+    target = os.path.join(ASSETS_DIR, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as fp:
+        fp.write(data)
+
+    written = 1
+    if compress and path.lower().endswith(COMPRESSED_EXTENSIONS):
+        with open(target + '.gz', 'wb') as fp:
+            fp.write(gzip.compress(data, compresslevel=9))
+        written += 1
+        if brotli is not None:
+            with open(target + '.br', 'wb') as fp:
+                fp.write(brotli.compress(data, quality=11))
+            written += 1
+    return written
+
+
+def main():
+    """Main method for the tool."""
+
+    # Read input arguments
+    args = get_args()
+
+    if args.compress and brotli is None:
+        print('Library brotli is not installed, only gzip variants are created.')
+
+    print('Cleaning up %s...' % ASSETS_DIR)
+    shutil.rmtree(ASSETS_DIR, ignore_errors=True)
+    os.makedirs(ASSETS_DIR)
+
+    print('Building assets...')
+    manifest = {}
+    written = 0
+    for path in list_static_files():
+        with open(os.path.join(STATIC_DIR, path), 'rb') as fp:
+            data = fp.read()
+        manifest[path] = fingerprint(path, data)
+        written += write_asset(manifest[path], data, args.compress)
+
+    with open(MANIFEST_FILE, 'w') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+
+    print('Built %d assets (%d files).' % (len(manifest), written))
+    print('Done.')
+
+
+if __name__ == '__main__':
+    main()
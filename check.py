@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Check reference lists of many manuscripts against retracted articles.
+
+The script accepts files and folders (searched recursively) of reference
+lists: plain text as pasted into the web form, RIS (.ris) or BibTeX (.bib).
+Citations are loaded once, then files are checked by a pool of processes.
+A result for each reference is written, as soon as its file is checked,
+to a CSV or JSON lines file (or to standard output).
+
+Example:
+    ./check.py manuscripts/ --output results.csv --processes 4
+
+For more information, try:
+    ./check.py --help
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from app import app, db
+from app.models import Article
+from app.corpus import get_corpus
+from app.readers import iter_lines, read_references
+from app.utils import parse_citations, parse_doi, doi_normalize, EXACT_MATCH, APPROX_MATCH
+
+# Fields of each result
+FIELDS = ('file', 'reference', 'citation', 'match', 'method', 'distance', 'article_id')
+
+# Extensions of files checked in folders
+EXTENSIONS = ('.txt', '.ris', '.bib')
+
+# Corpus and DOIs loaded by main process, shared with pool processes when forked
+_corpus = None
+_dois = None
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Check reference lists against retracted articles')
+    parser.add_argument('paths', metavar='PATH', nargs='+',
+                        help='reference list file, or folder of %s files' % ', '.join(EXTENSIONS))
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='output file, default is standard output')
+    parser.add_argument('-f', '--format', choices=('csv', 'jsonl'),
+                        help='output format, default is guessed from output file, else csv')
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count() or 1,
+                        help='number of processes, default is number of CPUs')
+    parser.add_argument('-d', '--max-distance', type=int,
+                        help='maximum edit distance, default is MAX_EDIT_DISTANCE of config')
+
+    args = parser.parse_args(*params)
+
+    # Check inputs
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error('PATH does not exist: %s' % path)
+    if args.output and os.path.isfile(args.output):
+        parser.error('Output file is currently existed: %s' % args.output)
+    if args.processes < 1:
+        parser.error('Number of processes must be at least 1')
+
+    # Guess output format
+    if args.format is None:
+        args.format = 'jsonl' if args.output and args.output.lower().endswith(('.jsonl', '.json')) else 'csv'
+    if args.max_distance is None:
+        args.max_distance = app.config['MAX_EDIT_DISTANCE']
+
+    # Return arguments
+    return args
+
+
+def list_files(paths):
+    """Returns files given, and files of supported types found in folders given."""
+
+    ret = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                ret.extend(os.path.join(root, name) for name in sorted(files)
+                           if name.lower().endswith(EXTENSIONS))
+        else:
+            ret.append(path)
+    return ret
+
+
+def read_file(file):
+    """
+    Read references of a file, with their DOIs if known
+
+    :param file:    reference list file path
+    :type file:     str
+    :return:        list of (citation, DOI or None) pairs
+    :rtype:         list
+    """
+
+    ext = os.path.splitext(file)[1].lower()
+    with open(file, 'rb') as fp:
+        if ext in ('.ris', '.bib'):
+            return list(read_references(iter_lines(fp), fmt=ext[1:]))
+        text = fp.read().decode('utf-8', errors='replace')
+    return [(citation, None) for citation in parse_citations(text)]
+
+
+def check_reference(citation, doi, max_distance):
+    """
+    Match a reference by its DOI, then by its citation
+
+    :return:    match type, method (doi, exact or edit_distance), edit distance and article ID,
+                or Nones if not matched
+    :rtype:     tuple
+    """
+
+    for value in [doi] if doi else parse_doi(citation):
+        article_id = _dois.get(doi_normalize(value))
+        if article_id is not None:
+            return EXACT_MATCH, 'doi', None, article_id
+
+    found = _corpus.closest(citation, max_distance)
+    if found is None:
+        return None, None, None, None
+    distance, article_id = found
+    if distance == 0:
+        return EXACT_MATCH, 'exact', 0, article_id
+    return APPROX_MATCH, 'edit_distance', distance, article_id
+
+
+def check_file(task):
+    """
+    Check all references of a file, runs in pool processes
+
+    :param task:    (file path, maximum edit distance)
+    :type task:     tuple
+    :return:        result of each reference, or error message
+    :rtype:         tuple
+    """
+
+    file, max_distance = task
+    try:
+        references = read_file(file)
+    except (IOError, ValueError) as e:
+        return file, [], str(e)
+
+    ret = []
+    for i, (citation, doi) in enumerate(references, 1):
+        matched, method, distance, article_id = check_reference(citation, doi, max_distance)
+        ret.append(dict(file=file, reference=i, citation=citation, match=matched, method=method,
+                        distance=distance, article_id=article_id))
+    return file, ret, None
+
+
+def main():
+    """Main method for the tool."""
+
+    global _corpus, _dois
+
+    # Read input arguments
+    args = get_args()
+    files = list_files(args.paths)
+    print('Found %d files.' % len(files), file=sys.stderr)
+
+    print('Loading citations...', file=sys.stderr)
+    with app.app_context():
+        _corpus = get_corpus()
+        _dois = {doi: id_ for id_, doi in db.session.query(Article.id, Article.normalized_doi) if doi}
+        db.session.close()
+    db.engine.dispose()
+    print('Loaded %d citations.' % len(_corpus), file=sys.stderr)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    if args.format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        write = lambda result: out.write(json.dumps(result) + '\n')
+
+    start = time.time()
+    counts = {EXACT_MATCH: 0, APPROX_MATCH: 0, None: 0}
+    with get_context('fork').Pool(args.processes) as pool:
+        tasks = [(file, args.max_distance) for file in files]
+        for file, results, error in pool.imap_unordered(check_file, tasks):
+            if error:
+                print('Skipped %s: %s' % (file, error), file=sys.stderr)
+            for result in results:
+                counts[result['match']] += 1
+                write(result)
+            out.flush()
+
+    if out is not sys.stdout:
+        out.close()
+
+    print('Checked %d references in %.1f seconds: %d exact and %d approximate matches.' % (
+        sum(counts.values()), time.time() - start, counts[EXACT_MATCH], counts[APPROX_MATCH]), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 # -*- coding: ascii -*-
 """Main config file of project."""
 
+import os
+
 # PostgreSQL database configuration
 DB_SETTINGS = {
     'host': 'localhost',
@@ -13,6 +15,179 @@ DB_SETTINGS = {
 # Maximum Levenshtein edit distance used for approximate matching
 MAX_EDIT_DISTANCE = 3
 
+# Variants of generated citations stored at ingest by freshdb.py, so that their
+# matches are exact. Available: 'ampersand' ('and' instead of '&'),
+# 'et_al' (other truncations of list of authors). Citations with a DOI of an
+# article are matched by the DOI, so no variant with DOIs is needed.
+CITATION_VARIANTS = ('ampersand', 'et_al')
+
+# SQLite file caching citations rendered by freshdb.py, so that only new or changed
+# articles are rendered again. Invalidated when the styles package changes.
+# None disables the cache.
+RENDER_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'renders.sqlite')
+
+# Candidate index used for approximate matching:
+#   'scan': compare against every citation in the database
+#   'lsh':  compare only against MinHash/LSH near-duplicates, using relative edit distance
+#   'blocking': compare only against citations sharing year and first author surname (with typos)
+#   'bktree': compare only against BK-tree nodes not pruned by the triangle inequality (same results as 'scan')
+#   'trigram': compare only against candidates selected by a pg_trgm index in PostgreSQL, without
+#              in-memory corpus in web processes (PostgreSQL only, other tools use 'scan')
+MATCH_INDEX = 'scan'
+
+# Minimum pg_trgm similarity of candidates selected by 'trigram' index. Bounds of
+# similarity of citations within MAX_EDIT_DISTANCE lower than it are raised to it,
+# which may miss matches of very short citations.
+TRIGRAM_MIN_SIMILARITY = 0.3
+
+# Load citations used for matching when the application starts (in uWSGI master
+# process, see run.py), so that web processes share them and are ready at once
+PRELOAD_CORPUS = True
+
+# Folder of BK-trees serialized by the 'bktree' index, built once per corpus generation.
+# Loaded trees are checked against citations, but the folder should only be writable
+# by the application.
+BKTREE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bktrees')
+
+# Reject citations whose character histograms differ too much from an input citation
+# with one vectorized operation, before comparing the others by edit distance. Used
+# when citations are scanned ('scan' index, and 'blocking' index outside of blocks)
+# if NumPy is installed.
+HISTOGRAM_FILTER = True
+
+# Number of LSH bands, must divide the MinHash signature length (64)
+LSH_BANDS = 16
+
+# Maximum edit distance relative to citation length, used by 'lsh' index.
+# MAX_EDIT_DISTANCE is still the lower limit.
+MAX_RELATIVE_EDIT_DISTANCE = 0.05
+
+# Seconds a citation check of the web form (or of live highlighting) may take.
+# Citations not checked in time are flagged, and can be checked by continuing.
+# Counted once citations are parsed and loaded, and checked between citations and
+# between chunks of compared citations, so parsing, loading and matcher shards are
+# not limited. The first citation is always checked, so that continuing progresses.
+# None disables the limit.
+MATCH_TIME_BUDGET = None
+
+# Matching tier of checks not asking for one (form, live highlighting and uploads):
+#   'doi': match DOIs only
+#   'exact': match DOIs and normalized citations
+#   'fuzzy': match DOIs, normalized citations and citations within MAX_EDIT_DISTANCE
+DEFAULT_MATCH_TIER = 'fuzzy'
+
+# Seconds a check of each matching tier may take (see MATCH_TIME_BUDGET), tiers
+# not listed use MATCH_TIME_BUDGET. None disables the limit of a tier.
+MATCH_TIER_BUDGETS = {
+    'doi': 1,
+    'exact': 2
+}
+
+# Folder of lock and result files used to check identical concurrent submissions
+# once, shared by all web processes. Results hold submitted texts, so the folder
+# is created only accessible by the application user, and coalescing is disabled
+# if an existing folder is not. None disables coalescing.
+SINGLE_FLIGHT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flight')
+
+# Seconds results of a check are shared with identical submissions
+SINGLE_FLIGHT_TTL = 10
+
+# Maximum seconds to wait for an identical check in progress
+SINGLE_FLIGHT_WAIT = 30
+
+# URLs of matcher shards started by matcher.py, shard i of n at index i, e.g.
+# ['http://127.0.0.1:5101', 'http://127.0.0.1:5102']. Citations are then matched
+# by the shards instead of web processes. None matches citations in web processes.
+MATCHER_SHARDS = None
+
+# Seconds to wait for a matcher shard
+MATCHER_TIMEOUT = 30
+
+# Maximum size in bytes of posted citations (checks, live highlighting and jobs),
+# larger posts are rejected with 413. None disables the limit.
+MAX_CHECK_SIZE = 1048576
+
+# Maximum number of citations checked by a request (jobs excepted), larger checks
+# are rejected with 413. None disables the limit.
+MAX_CHECK_CITATIONS = 1000
+
+# Folder of slot files of admission control, shared by all web processes. Other
+# users could hold slots by locking its files, so the folder is created only
+# accessible by the application user, and admission control is disabled if an
+# existing folder is not. None admits every check.
+ADMISSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admission')
+
+# Maximum number of checks running at once, lower than the number of web
+# processes (see wsgi.ini) so that other pages are still served
+CHECK_SLOTS = 3
+
+# Maximum number of checks waiting for a slot, others are rejected with 503
+CHECK_QUEUE = 1
+
+# Maximum seconds a check waits for a slot before being rejected with 503
+CHECK_QUEUE_WAIT = 10
+
+# Maximum number of checks of a client (by IP address) at once, others are
+# rejected with 429. None disables the limit.
+CLIENT_CHECKS = 2
+
+# Seconds rejected clients are told to wait (Retry-After header)
+RETRY_AFTER = 10
+
+# Submissions longer than this number of characters are queued for job workers
+# (see worker.py) instead of being checked by web processes. None disables queueing.
+JOB_THRESHOLD = None
+
+# SQLite database file of the job queue. Jobs hold submitted texts, so the file is
+# created only readable by the application user, in a folder only accessible by it.
+JOB_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs', 'jobs.sqlite')
+
+# Seconds after which a running job is considered abandoned and is queued again
+JOB_TIMEOUT = 600
+
+# Number of times an abandoned job is processed before it is marked as failed, so
+# that a job crashing its workers is not retried forever
+JOB_MAX_ATTEMPTS = 3
+
+# Seconds finished jobs are kept in the queue
+JOB_RETENTION = 86400
+
+# Number of bytes read at once from uploaded bibliography files
+UPLOAD_CHUNK_SIZE = 8192
+
+# Maximum size of a single reference in uploaded bibliography files, the rest is ignored
+UPLOAD_MAX_ENTRY_SIZE = 65536
+
+# Maximum size in bytes of uploaded bibliography files. Larger files are rejected
+# with 413, or cut with an error line when sent without length (chunked).
+# None disables the limit.
+UPLOAD_MAX_SIZE = 16777216
+
+# Seconds an upload may take to be read and checked while holding its admission
+# slot, so that slow clients cannot hold every slot. Slower uploads are cut with
+# an error line. None disables the limit.
+UPLOAD_TIME_LIMIT = 300
+
+# Requests checking citations are profiled with cProfile, profiles of requests
+# lasting longer than this number of seconds are saved. None disables profiling.
+PROFILE_THRESHOLD = None
+
+# Folder of saved profiles (.pstats files)
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# Number of most recent profiles kept
+PROFILE_KEEP = 50
+
+# Number of stack frames traced by tracemalloc from startup. 0 starts tracing
+# only when /admin/memory is requested, as tracing slows the application down.
+TRACEMALLOC_FRAMES = 0
+
+# Token of admin-only routes, given in X-Admin-Token header. None disables them.
+ADMIN_TOKEN = None
+
+# Seconds browsers may cache fingerprinted assets (see build_static.py)
+ASSETS_MAX_AGE = 31536000
+
 # Index page
 INDEX_PAGE_TITLE = 'Highlight citations to retracted articles.'
 INDEX_PAGE_HEADER = ''
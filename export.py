@@ -85,9 +85,11 @@ def main():
     for article in articles:
         fields = {
             k: v for k, v in article.__dict__.items()
-            if not k.startswith('_') and k != 'citations'
+            if not k.startswith('_') and k not in ('citations', 'shared_citations')
         }
-        for citation in article.citations:
+        for citation in article.shared_citations:
+            if citation.variant:
+                continue
             rows.append(
                 CsvRow(**fields, citation=citation.value, type=citation.type)
             )
@@ -14,12 +14,18 @@ import os
 import re
 import csv
 import time
+import hashlib
 from argparse import ArgumentParser
 from collections import namedtuple, OrderedDict
 from functools import partial
-from app import db
-from app.models import Article, Citation
+from sqlalchemy import inspect
+from app import app, db
+from app.models import Article, Citation, Metadata, citation_articles, GENERATION
+from app.lsh import minhash, pack_signature
+from app.utils import normalize, doi_normalize
 from styles import APA, AMA
+from styles.cache import RenderCache
+from styles.variants import gen_variants
 
 # Convention of fields in CSV file
 CsvRow = namedtuple('CsvRow', 'author author_full_name group_author '
@@ -54,6 +60,8 @@ def get_args(*params):
     parser = ArgumentParser(description='Refresh database by input CSV')
     parser.add_argument('file', metavar='FILE',
                         help='retracted articles file in CSV format')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='render all citations again, without RENDER_CACHE_PATH of config')
 
     args = parser.parse_args(*params)
 
@@ -102,7 +110,8 @@ def clear_data():
     sequences = []
     for table in reversed(meta.sorted_tables):
         db.session.execute(table.delete())
-        sequences.append('%s_id_seq' % table.name)
+        if 'id' in table.columns:
+            sequences.append('%s_id_seq' % table.name)
     db.session.commit()
 
     # Reset sequence numbers
@@ -111,21 +120,56 @@ def clear_data():
     db.session.commit()
 
 
+def schema_changed():
+    """Check if tables in the database differ from the models."""
+
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            return True
+        if {c['name'] for c in inspector.get_columns(table.name)} != set(table.columns.keys()):
+            return True
+    return False
+
+
 def db_init_or_reset():
     """Initialize database if starting a fresh.
-    Cleanup if database already exists."""
+    Cleanup if database already exists.
+    Re-create tables if their schema was changed."""
 
-    if db.engine.has_table(Article.__tablename__):
+    if db.engine.has_table(Article.__tablename__) and not schema_changed():
         clear_data()
     else:
+        db.drop_all()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            db.session.commit()
         db.create_all()
 
 
-def gen_citations(**fields):
-    """Generate all citations for a specific article based on article data."""
+def new_citation(value, type_, article_id, variant=None):
+    """Create a citation object with its MinHash signature."""
+    return Citation(value=value, normalized=normalize(value), type=type_, article_id=article_id, variant=variant,
+                    signature=pack_signature(minhash(value)))
+
+
+def add_variants(citations, variants, **fields):
+    """Generate variants of rendered citations, tagged with their variant names."""
+
+    ret = []
+    for value, type_, _ in citations:
+        style = type_.partition('_')[0]
+        for name, variant in gen_variants(value, style, variants, **fields):
+            ret.append((variant, type_, name))
+    return ret
+
+
+def render_citations(variants=(), **fields):
+    """Render all citations for a specific article based on article data,
+    followed by their variants, as (value, type, variant name) tuples."""
 
     ret = []
-    id_ = fields['id']
 
     # Generate styles
     apa = APA(**fields)
@@ -133,24 +177,111 @@ def gen_citations(**fields):
 
     # Add APA Journal
     if apa.journal:
-        ret.append(Citation(value=apa.journal, type=APA_JNL, article_id=id_))
+        ret.append((apa.journal, APA_JNL, None))
 
     # Add APA Conference
     if apa.conference:
-        ret.append(Citation(value=apa.conference, type=APA_CNF, article_id=id_))
+        ret.append((apa.conference, APA_CNF, None))
 
     # Add AMA Journal
     if ama.journal:
-        ret.append(Citation(value=ama.journal, type=AMA_JNL, article_id=id_))
+        ret.append((ama.journal, AMA_JNL, None))
 
     # Add AMA Conference
     if ama.conference:
-        ret.append(Citation(value=ama.conference, type=AMA_CNF, article_id=id_))
+        ret.append((ama.conference, AMA_CNF, None))
+
+    # Add variants of generated citations
+    if variants:
+        ret.extend(add_variants(ret, variants, **fields))
 
-    # Return generated citations or empty
+    # Return rendered citations or empty
     return ret
 
 
+def gen_citations(variants=(), cache=None, **fields):
+    """Generate all citations for a specific article based on article data,
+    followed by their variants. Renders are reused from cache if given."""
+
+    key = cache.key(fields, variants) if cache else None
+    rendered = cache.get(key) if cache else None
+    if rendered is None:
+        rendered = render_citations(variants, **fields)
+        if cache:
+            cache.put(key, rendered)
+
+    return [new_citation(value, type_, fields['id'], variant=variant) for value, type_, variant in rendered]
+
+
+def dedup_citations(citations):
+    """
+    Store each distinct citation once. Citations equal to a previous one once
+    normalized are dropped, and the articles rendering to them are linked to
+    the one kept. Citations which only differ by a few edits are all kept, so
+    that each of them is still compared by edit distance.
+    Citation IDs are assigned here, so that articles can be linked to them.
+
+    :param citations:       generated citations, variants after all others
+    :type citations:        list
+    :return:                distinct citations, and (citation ID, article ID) links
+                            of all articles rendering to them
+    :rtype:                 tuple
+    """
+
+    ret = []
+    links = set()
+    seen = {}
+
+    for citation in citations:
+        key = normalize(citation.value)
+        kept = seen.get(key)
+
+        # Exact duplicate
+        if kept is not None:
+            links.add((kept.id, citation.article_id))
+            continue
+
+        citation.id = len(ret) + 1
+        seen[key] = citation
+        ret.append(citation)
+        links.add((citation.id, citation.article_id))
+
+    return ret, sorted(links)
+
+
+def store_generation(citations, links):
+    """
+    Store generation of citations, a hash of their content, so that web
+    processes reload them (and rebuild their indexes) whenever it changes.
+
+    :param citations:   stored citations
+    :type citations:    list
+    :param links:       stored (citation ID, article ID) links
+    :type links:        list
+    :return:            generation
+    :rtype:             str
+    """
+
+    digest = hashlib.sha1()
+    for c in citations:
+        digest.update(('%d\x1f%s\x1f%s\x1f%d\x1f%s\x1e' % (
+            c.id, c.type, c.variant or '', c.article_id, c.normalized)).encode('utf-8'))
+    for citation_id, article_id in links:
+        digest.update(('%d\x1f%d\x1e' % (citation_id, article_id)).encode('ascii'))
+    generation = digest.hexdigest()
+
+    db.session.merge(Metadata(key=GENERATION, value=generation))
+    db.session.commit()
+    return generation
+
+
+def reset_sequence(table, start):
+    """Restart ID sequence of a table after rows were inserted with explicit IDs."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('ALTER SEQUENCE %s_id_seq RESTART WITH %d;' % (table.name, start))
+        db.session.commit()
+
+
 def parse_row(row):
     """Parses CSV row into Article object."""
     fields = OrderedDict(
@@ -173,6 +304,7 @@ def parse_row(row):
         index=int(row.index.strip()),
         doi=row.doi.strip()
     )
+    fields['normalized_doi'] = doi_normalize(fields['doi']) or None
     return Article(**fields)
 
 
@@ -205,18 +337,43 @@ def main():
             print('Generating citations for the articles...')
             articles = Article.query.all()
             objects = []
+            variants = []
+            path = app.config['RENDER_CACHE_PATH']
+            cache = RenderCache(path) if args.cache and path else None
             for article in articles:
                 fields = {
                     k: v for k, v in article.__dict__.items()
                     if not k.startswith('_')
                 }
-                objects.extend(gen_citations(**fields))
+                for citation in gen_citations(variants=app.config['CITATION_VARIANTS'], cache=cache, **fields):
+                    (variants if citation.variant else objects).append(citation)
+
+            if cache:
+                print('Reused cached citations of %d articles, rendered %d articles.' % (cache.hits, cache.misses))
+                cache.prune()
+                cache.close()
 
             if objects:
+                print('Generated %d citations, including %d variants.' % (
+                    len(objects) + len(variants), len(variants)))
+                generated = len(objects)
+
+                print('Removing duplicate citations...')
+                objects, links = dedup_citations(objects + variants)
+                scanned = sum(1 for c in objects if not c.variant)
+                print('Stored %d distinct citations, linked to their %d articles.' % (len(objects), len(articles)))
+                print('Citations compared by edit distance per checked citation: %d -> %d (-%.1f%%).' % (
+                    generated, scanned, 100.0 * (generated - scanned) / generated))
+
                 print('Inserting citations into the database...')
                 db.session.bulk_save_objects(objects)
                 db.session.commit()
+                db.session.execute(citation_articles.insert(),
+                                   [{'citation_id': c, 'article_id': a} for c, a in links])
+                db.session.commit()
+                print('Stored generation %s of citations.' % store_generation(objects, links))
                 db.session.close()
+                reset_sequence(Citation.__table__, len(objects) + 1)
                 time.sleep(.5)
             else:
                 print('No citation was generated.')
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Serve shards of the citation corpus to the web application.
+
+Citations are partitioned by ID of their article: shard i of n holds
+citations of articles whose ID modulo n is i. Each shard is served over
+HTTP by its own process, which loads only its part of the corpus. Web
+processes send parsed citations to all shards listed in MATCHER_SHARDS
+(see config.py) and keep the closest match.
+
+Start all shards on this machine, listening on consecutive ports:
+    ./matcher.py --shards 4 --port 5101
+
+Or start a single shard, e.g. one per machine:
+    ./matcher.py --shards 4 --shard 2 --host 0.0.0.0 --port 5101
+
+For more information, try:
+    ./matcher.py --help
+"""
+
+import sys
+import time
+import signal
+from argparse import ArgumentParser
+from multiprocessing import Process
+from app.shards import make_shard_server
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Serve shards of the citation corpus')
+    parser.add_argument('-n', '--shards', type=int, default=1,
+                        help='total number of shards, default is 1')
+    parser.add_argument('-s', '--shard', type=int,
+                        help='serve only this shard (0 to SHARDS - 1), default is all shards')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='listening address, default is 127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=5101,
+                        help='listening port, shard i of all shards listens on PORT + i, default is 5101')
+
+    args = parser.parse_args(*params)
+
+    # Check shards
+    if args.shards < 1:
+        parser.error('Number of shards must be at least 1')
+    if args.shard is not None and not 0 <= args.shard < args.shards:
+        parser.error('Shard must be between 0 and %d' % (args.shards - 1))
+
+    # Return arguments
+    return args
+
+
+def serve(host, port, shard, shards):
+    """
+    Serve a shard until terminated
+
+    :param host:    listening address
+    :type host:     str
+    :param port:    listening port
+    :type port:     int
+    :param shard:   index of shard
+    :type shard:    int
+    :param shards:  total number of shards
+    :type shards:   int
+    """
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = make_shard_server(host, port, (shard, shards))
+    print('Serving shard %d of %d on http://%s:%d' % (shard, shards, host, port))
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+def main():
+    """Main method for the tool."""
+
+    # Read input arguments
+    args = get_args()
+
+    if args.shard is not None:
+        try:
+            serve(args.host, args.port, args.shard, args.shards)
+        except KeyboardInterrupt:
+            print('Stopping...')
+        return
+
+    def start(i):
+        process = Process(target=serve, args=(args.host, args.port + i, i, args.shards), daemon=True)
+        process.start()
+        return process
+
+    print('Starting %d shard processes...' % args.shards)
+    shards = [start(i) for i in range(args.shards)]
+
+    # Stop shards on termination
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            for i, process in enumerate(shards):
+                if not process.is_alive():
+                    print('Restarting shard process %d...' % i)
+                    shards[i] = start(i)
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        print('Stopping...')
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in shards:
+            process.terminate()
+        for process in shards:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
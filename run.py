@@ -12,6 +12,12 @@ For more information about how to install and run recite, please refer to "READM
 """
 
 from app import app as application
+from app.corpus import preload_corpus
+from app.views import remote_matching
+
+# Load corpus in uWSGI master process, before workers are forked
+if application.config['PRELOAD_CORPUS'] and not remote_matching():
+    preload_corpus()
 
 if __name__ == '__main__':
     application.run(host='0.0.0.0', port=5000)
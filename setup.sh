@@ -32,6 +32,7 @@ fi
 
 scriptdir=$(realpath "$(dirname $0)")
 sysfile="/etc/systemd/system/recite.service"
+workerfile="/etc/systemd/system/recite-worker.service"
 
 # Check install requirements
 pip3 install -r $scriptdir/requirements.txt --upgrade
@@ -41,6 +42,9 @@ if ! which uwsgi &> /dev/null; then
     exit 1
 fi
 
+# Build static assets
+python3 $scriptdir/build_static.py
+
 # Create recite service
 uwsgi_cmd=`which uwsgi`
 cat > $sysfile <<EOF
@@ -61,6 +65,24 @@ NotifyAccess=all
 WantedBy=multi-user.target
 EOF
 
+# Create recite job worker service
+python_cmd=`which python3`
+cat > $workerfile <<EOF
+[Unit]
+Description=Job workers for recite app
+After=syslog.target
+
+[Service]
+ExecStart=$python_cmd $scriptdir/worker.py
+WorkingDirectory=$scriptdir
+Restart=always
+KillSignal=SIGTERM
+StandardError=syslog
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # Create postgresql user
 echo "Creating PostgreSQL user and database..."
 read -p 'Username/DBname: ' psql_user
@@ -77,6 +99,7 @@ cd $cur_dir || exit
 # Enable and restart services
 systemctl daemon-reload
 systemctl restart recite.service
+systemctl restart recite-worker.service
 systemctl restart postgresql.service
 
 echo "Done!"
@@ -0,0 +1,106 @@
+# -*- coding: ascii -*-
+"""
+styles.cache
+~~~~~~~~~~~~
+
+Persistent cache of citations rendered by styles, stored in a local
+SQLite file. Renders are keyed by a hash of the article fields and of
+the source code of the styles package, so that they are invalidated
+automatically whenever a style changes.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+__all__ = ['styles_version', 'RenderCache']
+
+# Article fields not used by styles, ignored in cache keys
+IGNORED_FIELDS = ('id', 'index', 'normalized_doi')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS renders (
+    key TEXT PRIMARY KEY,
+    citations TEXT NOT NULL,
+    used REAL NOT NULL
+);
+'''
+
+
+def styles_version():
+    """Returns hash of the source code of the styles package"""
+
+    digest = hashlib.sha256()
+    path = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.py'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(path, name), 'rb') as fp:
+                digest.update(fp.read())
+    return digest.hexdigest()[:16]
+
+
+class RenderCache:
+    """Rendered citations by hash of article fields, backed by a SQLite database file"""
+
+    def __init__(self, path, version=None):
+        """
+        :param path:    path to SQLite database file
+        :type path:     str
+        :param version: version of styles, default is hash of their source code
+        :type version:  str or None
+        """
+        self.version = version or styles_version()
+        self.hits = self.misses = 0
+        self._started = time.time()
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+
+    def key(self, fields, variants=()):
+        """
+        Cache key of citations rendered from article fields
+
+        :param fields:      article fields
+        :type fields:       dict
+        :param variants:    names of variants rendered too
+        :type variants:     list or tuple
+        :return:            hash of fields, variants and styles version
+        :rtype:             str
+        """
+
+        data = {k: v for k, v in fields.items() if k not in IGNORED_FIELDS}
+        data = json.dumps([self.version, list(variants), data], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns cached citations of key, or None if not cached"""
+
+        row = self._conn.execute('SELECT citations FROM renders WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute('UPDATE renders SET used = ? WHERE key = ?', (time.time(), key))
+        return [tuple(c) for c in json.loads(row[0])]
+
+    def put(self, key, citations):
+        """Store rendered citations of key"""
+        self._conn.execute('INSERT OR REPLACE INTO renders (key, citations, used) VALUES (?, ?, ?)',
+                           (key, json.dumps(citations), time.time()))
+
+    def prune(self):
+        """
+        Remove renders not used since the cache was opened, e.g. of
+        removed articles or of previous versions of styles
+
+        :return:    number of removed renders
+        :rtype:     int
+        """
+        return self._conn.execute('DELETE FROM renders WHERE used < ?', (self._started,)).rowcount
+
+    def close(self):
+        """Commit changes and close the cache"""
+        self._conn.commit()
+        self._conn.close()
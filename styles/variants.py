@@ -0,0 +1,92 @@
+# -*- coding: ascii -*-
+"""
+styles.variants
+~~~~~~~~~~~~~~~
+
+Generate common variants of citations in APA and AMA styles.
+"""
+
+from collections import OrderedDict
+from .apa import gen_author
+from .parsers import parse_author
+
+__all__ = ['VARIANTS', 'gen_variants']
+
+
+def ampersand(citation, style, **fields):
+    """Variants using 'and' instead of '&', with or without serial comma."""
+
+    if ' & ' in citation:
+        yield citation.replace(' & ', ' and ')
+        yield citation.replace(', & ', ' & ')
+        yield citation.replace(', & ', ' and ')
+
+
+def ama_author(authors, group_author=None):
+    """Generates authors string in AMA format from list of authors."""
+
+    ret = ', '.join(authors)
+    if group_author:
+        ret += '{}{}'.format('; ' if ret else '', group_author.title())
+    return ret
+
+
+def et_al(citation, style, **fields):
+    """Variants with other truncations of the list of authors."""
+
+    author = fields.get('author') or ''
+    group_author = fields.get('group_author')
+
+    if style == 'apa':
+        original = gen_author(author, group_author)
+        authors = parse_author(author, surname_sep=', ', initial_sep=' ', initial_suffix='.')
+        if group_author:
+            authors.append(group_author.title())
+        variants = []
+        if len(authors) > 7:
+            variants.append('%s, & %s' % (', '.join(authors[:-1]), authors[-1]))
+        if len(authors) > 2:
+            variants.append('%s, et al' % authors[0])
+        variants = [v if v.endswith('.') else v + '.' for v in variants]
+
+    else:
+        authors = parse_author(author)
+        original = ama_author(authors[:3] + ['et al'] if len(authors) > 6 else authors, group_author)
+        variants = []
+        if len(authors) > 6:
+            variants.append(ama_author(authors, group_author))
+            variants.append(ama_author(authors[:6] + ['et al'], group_author))
+        elif len(authors) > 3:
+            variants.append(ama_author(authors[:3] + ['et al'], group_author))
+
+    if original and citation.startswith(original):
+        for variant in variants:
+            yield variant + citation[len(original):]
+
+
+#: Available variant generators by name
+VARIANTS = OrderedDict([
+    ('ampersand', ampersand),
+    ('et_al', et_al)
+])
+
+
+def gen_variants(citation, style, names=tuple(VARIANTS), **fields):
+    """
+    Generates variants of a citation.
+
+    :param citation:    citation generated for article
+    :param style:       style of citation, 'apa' or 'ama'
+    :param names:       names of variants to be generated, default is all
+    :param fields:      article fields the citation was generated from
+    :return:            list of (variant name, variant citation), without duplicates
+    """
+
+    ret = []
+    seen = {citation}
+    for name in names:
+        for variant in VARIANTS[name](citation, style, **fields):
+            if variant not in seen:
+                seen.add(variant)
+                ret.append((name, variant))
+    return ret
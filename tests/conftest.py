@@ -0,0 +1,69 @@
+# -*- coding: ascii -*-
+"""
+Fixtures of tests, run from the project folder with:
+    python -m pytest tests
+
+The application is configured with a temporary SQLite database and
+temporary folders, holding a few retracted articles and their citations.
+"""
+
+import os
+import shutil
+import tempfile
+import pytest
+
+# Configuration of the application, set before it is imported
+_TMP = tempfile.mkdtemp(prefix='recite-test-')
+with open(os.path.join(_TMP, 'config.py'), 'w') as fp:
+    fp.write('\n'.join([
+        'DB_SETTINGS = {"driver": "sqlite", "dbname": %r}' % os.path.join(_TMP, 'recite.db'),
+        'JOB_QUEUE_PATH = %r' % os.path.join(_TMP, 'jobs.sqlite'),
+        'SINGLE_FLIGHT_PATH = None',
+        'ADMISSION_PATH = None',
+        'BKTREE_PATH = %r' % os.path.join(_TMP, 'bktrees'),
+        'RENDER_CACHE_PATH = None',
+        'PRELOAD_CORPUS = False',
+        'JOB_THRESHOLD = None',
+        ''
+    ]))
+os.environ['RECITE_CONFIG'] = os.path.join(_TMP, 'config.py')
+
+from app import app as _app, db  # noqa: E402
+from app.models import Article  # noqa: E402
+import freshdb  # noqa: E402
+
+#: Citations of retracted articles stored by the fixture
+CITATIONS = [
+    'Smith, J., & Doe, A. B. (2010). Effects of things on stuff. Journal of Stuff, 12(3), 100-110.',
+    'Tran, K. (2013). A study of widgets. Widget Science, 4, 1-9.',
+    'Lee, C., & Park, D. (2015). Deep results in shallow waters. Ocean Letters, 7(2), 55-61.'
+]
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Application with a database holding CITATIONS"""
+
+    with _app.app_context():
+        db.create_all()
+        citations = []
+        for i, value in enumerate(CITATIONS, 1):
+            db.session.add(Article(id=i, author='Author', author_full_name='Author', article_title='Title %d' % i))
+            citations.append(freshdb.new_citation(value, freshdb.APA_JNL, i))
+        db.session.commit()
+        citations, links = freshdb.dedup_citations(citations)
+        db.session.bulk_save_objects(citations)
+        db.session.execute(freshdb.citation_articles.insert(),
+                           [{'citation_id': c, 'article_id': a} for c, a in links])
+        db.session.commit()
+        freshdb.store_generation(citations, links)
+        db.session.remove()
+
+    yield _app
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    """Test client of the application"""
+    return app.test_client()
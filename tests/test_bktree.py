@@ -0,0 +1,35 @@
+# -*- coding: ascii -*-
+"""Tests of serialized BK-trees"""
+
+import json
+from collections import namedtuple
+from app.bktree import BKTree
+
+Entry = namedtuple('Entry', 'id normalized')
+
+ENTRIES = [Entry(i, value) for i, value in enumerate(['abcd', 'abce', 'abde', 'xyz', 'abcdef', 'bcd'], 1)]
+
+
+def test_load(tmp_path):
+    path = str(tmp_path / 'tree.json')
+    tree = BKTree(ENTRIES)
+    tree.dump(path)
+    loaded = BKTree.load(path, ENTRIES)
+    assert sorted(e.id for e in loaded.query('abcd', 1)) == sorted(e.id for e in tree.query('abcd', 1))
+
+
+def test_load_changed_values(tmp_path):
+    path = str(tmp_path / 'tree.json')
+    BKTree(ENTRIES).dump(path)
+    assert BKTree.load(path, ENTRIES[:-1] + [Entry(6, 'bce')]) is None
+
+
+def test_load_back_edge(tmp_path):
+    path = str(tmp_path / 'tree.json')
+    BKTree(ENTRIES).dump(path)
+    with open(path) as fp:
+        data = json.load(fp)
+    data['children'][1].append([9, 1])
+    with open(path, 'w') as fp:
+        json.dump(data, fp)
+    assert BKTree.load(path, ENTRIES) is None
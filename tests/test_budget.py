@@ -0,0 +1,35 @@
+# -*- coding: ascii -*-
+"""Tests of the time budget of checks"""
+
+import re
+import json
+import html
+import pytest
+from conftest import CITATIONS
+
+# Hidden fields of the form continuing a check
+find_checked = re.compile(r'name="checked" value="([^"]*)"').findall
+
+
+@pytest.fixture
+def no_budget(app):
+    """Time budget too small to check a single citation"""
+    budgets = app.config['MATCH_TIER_BUDGETS']
+    app.config['MATCH_TIER_BUDGETS'] = {'fuzzy': 0}
+    yield
+    app.config['MATCH_TIER_BUDGETS'] = budgets
+
+
+def test_continue_progresses(client, no_budget):
+    text = '\n'.join(CITATIONS)
+    checked = []
+    for count in range(1, len(CITATIONS)):
+        page = client.post('/', data={'citations': text, 'checked': json.dumps(checked), 'tier': 'fuzzy'})
+        assert page.status_code == 200
+        found = find_checked(page.get_data(as_text=True))
+        checked = json.loads(html.unescape(found[0]))
+        assert len(checked) == count
+
+    page = client.post('/', data={'citations': text, 'checked': json.dumps(checked), 'tier': 'fuzzy'})
+    assert not find_checked(page.get_data(as_text=True))
+    assert page.get_data(as_text=True).count('<mark class="exact-match">') == len(CITATIONS)
@@ -0,0 +1,61 @@
+# -*- coding: ascii -*-
+"""Tests of queued citation checks"""
+
+import os
+import stat
+import time
+from app.jobs import JobQueue, FAILED
+from app.views import get_job_queue, process_job
+from conftest import CITATIONS
+
+SCRIPT = '<script>alert(document.cookie)</script>'
+
+
+def submit(client, text):
+    """Queue a job, returns its URL"""
+    response = client.post('/jobs', data={'citations': text})
+    assert response.status_code == 202
+    return response.get_json()['url']
+
+
+def run_job():
+    """Process the oldest queued job as a worker would"""
+    job_id, data = get_job_queue().claim()
+    get_job_queue().finish(job_id, process_job(data))
+
+
+def test_pending_job_is_escaped(client, app):
+    url = submit(client, SCRIPT + '\n' + CITATIONS[1])
+    page = client.get(url, headers={'Accept': 'text/html'}).get_data(as_text=True)
+    assert SCRIPT not in page
+    assert '&lt;script&gt;' in page
+    with app.app_context():
+        run_job()
+
+
+def test_done_job_is_escaped(client, app):
+    url = submit(client, SCRIPT + '\n' + CITATIONS[1])
+    with app.app_context():
+        run_job()
+    page = client.get(url, headers={'Accept': 'text/html'}).get_data(as_text=True)
+    assert SCRIPT not in page
+    assert '&lt;script&gt;' in page
+    assert '<mark class="exact-match">' in page
+
+
+def test_queue_is_private(tmp_path):
+    path = str(tmp_path / 'jobs' / 'jobs.sqlite')
+    JobQueue(path).enqueue('text')
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_abandoned_job_fails(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite'), timeout=0, max_attempts=2)
+    job_id = queue.enqueue('text')
+    for _ in range(2):
+        time.sleep(.01)
+        assert queue.claim() == (job_id, 'text')
+    time.sleep(.01)
+    assert queue.claim() is None
+    assert queue.get(job_id)['status'] == FAILED
@@ -0,0 +1,50 @@
+# -*- coding: ascii -*-
+"""Tests of databases created by an older freshdb.py"""
+
+import logging
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import corpus
+
+# Tables and columns of databases created before citations were normalized
+OLD_TABLES = {
+    'retracted_articles': ['id', 'author', 'author_full_name', 'article_title', 'doi'],
+    'citations': ['id', 'value', 'type', 'article_id']
+}
+
+
+class OldInspector:
+    """Inspector of a database holding OLD_TABLES"""
+
+    def get_table_names(self):
+        return list(OLD_TABLES)
+
+    def get_columns(self, table):
+        return [{'name': name} for name in OLD_TABLES[table]]
+
+
+def test_missing_schema(app, monkeypatch):
+    with app.app_context():
+        assert corpus.missing_schema() == []
+        monkeypatch.setattr(corpus, 'inspect', lambda engine: OldInspector())
+        missing = corpus.missing_schema()
+    assert 'metadata' in missing
+    assert 'citation_articles' in missing
+    assert 'citations.normalized' in missing
+    assert 'citations.signature' in missing
+    assert 'citations.variant' in missing
+    assert 'retracted_articles.normalized_doi' in missing
+
+
+def test_old_database_is_reported(app, monkeypatch, caplog):
+    def load_corpus(generation, shard=None):
+        raise OperationalError('SELECT', {}, Exception('no such column: citations.normalized'))
+
+    monkeypatch.setattr(corpus, '_corpus', None)
+    monkeypatch.setattr(corpus, 'load_corpus', load_corpus)
+    monkeypatch.setattr(corpus, 'inspect', lambda engine: OldInspector())
+    with app.app_context(), caplog.at_level(logging.ERROR):
+        with pytest.raises(OperationalError):
+            corpus.get_corpus()
+    assert 'run freshdb.py' in caplog.text
+    assert 'citations.normalized' in caplog.text
@@ -0,0 +1,55 @@
+# -*- coding: ascii -*-
+"""Tests of bibliography uploads"""
+
+import io
+import json
+import pytest
+from conftest import CITATIONS
+
+
+def upload(client, body, **args):
+    """Upload a bibliography, returns status and decoded JSON lines"""
+    response = client.post('/upload', data=body, query_string=args, content_type='text/plain')
+    return response.status_code, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('body', [b'', b'  \n\n\t\r\n  '])
+def test_empty_upload(client, body):
+    assert upload(client, body) == (200, [{'citations': 0, 'matches': 0}])
+
+
+def test_text_upload(client):
+    status, lines = upload(client, ('\n\n'.join(CITATIONS[:2]) + '\n').encode('ascii'), format='txt')
+    assert status == 200
+    assert [line.get('match') for line in lines[:-1]] == ['exact', 'exact']
+    assert lines[-1] == {'citations': 2, 'matches': 2}
+
+
+def chunked(client, path, body, **args):
+    """Post body without length, as a chunked request"""
+    return client.post(path, input_stream=io.BytesIO(body), query_string=args, content_type='text/plain',
+                       environ_overrides={'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''})
+
+
+def test_upload_too_large(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_MAX_SIZE', 64)
+    monkeypatch.setitem(app.config, 'UPLOAD_CHUNK_SIZE', 16)
+    body = ('\n\n'.join(CITATIONS) + '\n').encode('ascii')
+    assert upload(client, body)[0] == 413
+
+    response = chunked(client, '/upload', body)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[-2] == {'error': 'Input is larger than 64 bytes'}
+    assert lines[-1]['citations'] == 0
+
+
+def test_upload_time_limit(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_TIME_LIMIT', 0)
+    status, lines = upload(client, CITATIONS[0].encode('ascii'))
+    assert status == 200
+    assert lines == [{'error': 'Input was not read in time'}, {'citations': 0, 'matches': 0}]
+
+
+def test_chunked_post(client):
+    response = chunked(client, '/', b'citations=x')
+    assert response.status_code == 411
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Process citation checks queued by the web application.
+
+Large submissions (see JOB_THRESHOLD in config.py) and submissions to
+the /jobs endpoint are stored in a local job queue. This script starts
+a pool of worker processes, separated from the web processes, which
+take jobs from the queue and store their results.
+
+For more information, try:
+    ./worker.py --help
+"""
+
+import os
+import sys
+import time
+import signal
+import traceback
+from argparse import ArgumentParser
+from multiprocessing import Process
+from app import app
+from app.views import get_job_queue, process_job
+
+# Seconds between purges of finished jobs
+PURGE_INTERVAL = 3600
+
+
+def get_args(*params):
+    """Parses and reads input arguments from command line."""
+
+    parser = ArgumentParser(description='Process queued citation checks')
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes, default is number of CPUs')
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help='seconds to wait when queue is empty, default is 1')
+
+    args = parser.parse_args(*params)
+
+    # Check number of processes
+    if args.processes < 1:
+        parser.error('Number of processes must be at least 1')
+
+    # Return arguments
+    return args
+
+
+def work(interval):
+    """
+    Process jobs until terminated
+
+    :param interval:    seconds to wait when queue is empty
+    :type interval:     float
+    """
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    queue = get_job_queue()
+    purged = 0
+    while True:
+        if time.time() - purged > PURGE_INTERVAL:
+            queue.purge(app.config['JOB_RETENTION'])
+            purged = time.time()
+
+        job = queue.claim()
+        if job is None:
+            time.sleep(interval)
+            continue
+
+        job_id, data = job
+        with app.app_context():
+            try:
+                result = process_job(data)
+            except Exception as e:
+                traceback.print_exc()
+                queue.fail(job_id, e)
+            else:
+                queue.finish(job_id, result)
+
+
+def main():
+    """Main method for the tool."""
+
+    # Read input arguments
+    args = get_args()
+
+    print('Starting %d worker processes...' % args.processes)
+    workers = [Process(target=work, args=(args.interval,), daemon=True) for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+
+    # Stop workers on termination
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            for i, worker in enumerate(workers):
+                if not worker.is_alive():
+                    print('Restarting worker process %d...' % i)
+                    workers[i] = Process(target=work, args=(args.interval,), daemon=True)
+                    workers[i].start()
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        print('Stopping...')
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == '__main__':
+    main()